@@ -0,0 +1,252 @@
+"""gzip and Brotli for request and response bodies.
+
+Compressed request bodies (Content-Encoding: gzip or br) are decoded before
+they reach the endpoints, up to a size limit that guards against
+decompression bombs. Responses are compressed with the best encoding the
+client accepts, Brotli over gzip. Streamed responses (NDJSON exports and
+progress) are flushed after every chunk so they keep arriving as they are
+produced.
+"""
+import asyncio
+import zlib
+from typing import Optional
+
+import brotli
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.responses import JSONResponse
+
+# Already compressed content that is not worth another pass
+SKIP_MEDIA_TYPES = ("image/", "video/", "application/gzip", "application/zip")
+# Preferred first
+SUPPORTED_ENCODINGS = ("br", "gzip")
+
+
+def choose_encoding(accept_encoding: str) -> Optional[str]:
+    """Best supported encoding allowed by an Accept-Encoding header"""
+    weights = {}
+    for part in accept_encoding.split(","):
+        coding, _, params = part.strip().partition(";")
+        q = 1.0
+        params = params.strip()
+        if params.startswith("q="):
+            try:
+                q = float(params[2:])
+            except ValueError:
+                q = 0.0
+        weights[coding.strip().lower()] = q
+    for encoding in SUPPORTED_ENCODINGS:
+        if weights.get(encoding, weights.get("*", 0.0)) > 0:
+            return encoding
+    return None
+
+
+class GzipEncoder:
+    def __init__(self, level: int):
+        self._compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        out = self._compressor.compress(data)
+        if flush:
+            out += self._compressor.flush(zlib.Z_SYNC_FLUSH)
+        return out
+
+    def finish(self) -> bytes:
+        return self._compressor.flush()
+
+
+class BrotliEncoder:
+    def __init__(self, quality: int):
+        self._compressor = brotli.Compressor(quality=quality)
+
+    def compress(self, data: bytes, flush: bool = False) -> bytes:
+        out = self._compressor.process(data)
+        if flush:
+            out += self._compressor.flush()
+        return out
+
+    def finish(self) -> bytes:
+        return self._compressor.finish()
+
+
+def decompress(body: bytes, encoding: str, max_size: int) -> bytes:
+    """Decode a request body, raising ValueError past max_size bytes"""
+    if encoding in ("gzip", "x-gzip"):
+        decompressor = zlib.decompressobj(31)
+        data = decompressor.decompress(body, max_size + 1)
+        if decompressor.unconsumed_tail:
+            raise ValueError("too large")
+        if not decompressor.eof:
+            raise zlib.error("truncated gzip stream")
+    else:
+        decompressor = brotli.Decompressor()
+        data = b""
+        offset = 0
+        # output_buffer_limit keeps a bomb from inflating past max_size in
+        # one call; the decoder then takes no input until it was drained
+        while not decompressor.is_finished() and len(data) <= max_size:
+            chunk = b""
+            if decompressor.can_accept_more_data():
+                chunk = body[offset:offset + 65536]
+                offset += len(chunk)
+            out = decompressor.process(chunk, output_buffer_limit=max_size + 1 - len(data))
+            if not chunk and not out:
+                raise brotli.error("truncated brotli stream")
+            data += out
+    if len(data) > max_size:
+        raise ValueError("too large")
+    return data
+
+
+class CompressionMiddleware:
+    """ASGI middleware decoding compressed requests and compressing responses.
+
+    Add it before MetricsMiddleware so that the metrics see the bytes that
+    actually go over the wire.
+    """
+
+    def __init__(self, app, minimum_size: int = 1024, max_request_size: int = 64 * 1024 * 1024,
+                 gzip_level: int = 6, brotli_quality: int = 4):
+        self.app = app
+        self.minimum_size = minimum_size
+        self.max_request_size = max_request_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        headers = Headers(scope=scope)
+        content_encoding = headers.get("content-encoding", "identity").strip().lower()
+        if content_encoding != "identity":
+            receive = await self.decoded_receive(scope, receive, send, content_encoding)
+            if receive is None:
+                return
+
+        encoding = choose_encoding(headers.get("accept-encoding", ""))
+        if encoding is None:
+            await self.app(scope, receive, send)
+            return
+        await self.app(scope, receive, CompressingSend(send, encoding, self))
+
+    async def decoded_receive(self, scope, receive, send, content_encoding: str):
+        """Read and decode the whole request body; None once an error response was sent"""
+        if content_encoding not in ("gzip", "x-gzip", "br"):
+            await JSONResponse({"detail": f"Unsupported Content-Encoding: {content_encoding}"}, 415)(scope, receive, send)
+            return None
+
+        chunks = []
+        size = 0
+        more_body = True
+        while more_body:
+            message = await receive()
+            if message["type"] == "http.disconnect":
+                return None
+            chunks.append(message.get("body", b""))
+            size += len(chunks[-1])
+            more_body = message.get("more_body", False)
+            if size > self.max_request_size:
+                await JSONResponse({"detail": "Request body too large"}, 413)(scope, receive, send)
+                return None
+        try:
+            # Up to max_request_size of CPU work; keep it off the event loop
+            body = await asyncio.to_thread(decompress, b"".join(chunks), content_encoding, self.max_request_size)
+        except ValueError:
+            await JSONResponse({"detail": "Request body too large"}, 413)(scope, receive, send)
+            return None
+        except Exception:
+            await JSONResponse({"detail": f"Invalid {content_encoding} request body"}, 400)(scope, receive, send)
+            return None
+
+        # Updated in place: the router stores the matched route in this scope
+        # and MetricsMiddleware reads it from there
+        scope["headers"] = [
+            (name, value) for name, value in scope["headers"] if name not in (b"content-encoding", b"content-length")
+        ] + [(b"content-length", str(len(body)).encode())]
+
+        sent = False
+
+        async def replay():
+            nonlocal sent
+            if sent:
+                return await receive()
+            sent = True
+            return {"type": "http.request", "body": body, "more_body": False}
+
+        return replay
+
+    def encoder(self, encoding: str):
+        if encoding == "br":
+            return BrotliEncoder(self.brotli_quality)
+        return GzipEncoder(self.gzip_level)
+
+
+class CompressingSend:
+    """Wraps `send` to compress the response body, if it is worth it"""
+
+    def __init__(self, send, encoding: str, middleware: CompressionMiddleware):
+        self.send = send
+        self.encoding = encoding
+        self.middleware = middleware
+        self.start_message = None
+        self.encoder = None
+        self.passthrough = False
+
+    def compressible(self, headers: MutableHeaders) -> bool:
+        if "content-encoding" in headers:
+            return False
+        return not headers.get("content-type", "").startswith(SKIP_MEDIA_TYPES)
+
+    def prepare_headers(self, headers: MutableHeaders, length: Optional[int]):
+        headers["Content-Encoding"] = self.encoding
+        if length is None:
+            del headers["Content-Length"]
+        else:
+            headers["Content-Length"] = str(length)
+        # The compressed bytes differ from the identity ones, so the ETag can
+        # only claim semantic equivalence (If-None-Match compares weakly)
+        etag = headers.get("etag")
+        if etag and not etag.startswith("W/"):
+            headers["ETag"] = "W/" + etag
+
+    async def __call__(self, message):
+        if self.passthrough:
+            await self.send(message)
+            return
+        if message["type"] == "http.response.start":
+            self.start_message = message
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.encoder is None:
+            headers = MutableHeaders(raw=self.start_message["headers"])
+            if self.compressible(headers):
+                headers.add_vary_header("Accept-Encoding")
+            if (not self.compressible(headers) or self.start_message["status"] in (204, 304)
+                    or (not more_body and len(body) < self.middleware.minimum_size)):
+                self.passthrough = True
+                await self.send(self.start_message)
+                await self.send(message)
+                return
+
+            self.encoder = self.middleware.encoder(self.encoding)
+            if not more_body:
+                compressed = self.encoder.compress(body) + self.encoder.finish()
+                self.prepare_headers(headers, len(compressed))
+                await self.send(self.start_message)
+                await self.send({"type": "http.response.body", "body": compressed})
+                return
+            self.prepare_headers(headers, None)
+            await self.send(self.start_message)
+
+        if more_body:
+            chunk = self.encoder.compress(body, flush=True)
+        else:
+            chunk = self.encoder.compress(body) + self.encoder.finish()
+        await self.send({"type": "http.response.body", "body": chunk, "more_body": more_body})
@@ -0,0 +1,109 @@
+"""Vectorized measurement geometry.
+
+Mirrors calculateResult in frontend/store/measurementStore.ts: points are in
+pixels, calibrationScale is pixels per mm, and results are in mm / mm² / mm³.
+Many measurements are computed together by packing all of their points into
+one array and reducing per measurement with np.add.reduceat.
+"""
+from typing import Dict, List, Optional, Sequence
+
+import numpy as np
+
+CLOSED_MODES = ("area", "volume")
+
+
+def pack_points(point_lists: Sequence[Sequence[Sequence[float]]]):
+    """Pack per-measurement [(x, y), ...] lists or (n, 2) arrays into one (N, 2) array plus counts"""
+    arrays = [np.asarray(points, dtype=np.float64).reshape(-1, 2) for points in point_lists]
+    counts = np.fromiter((len(a) for a in arrays), dtype=np.int64, count=len(arrays))
+    xy = np.concatenate(arrays) if arrays else np.empty((0, 2))
+    return xy, counts
+
+
+def measure(xy: np.ndarray, counts: np.ndarray, scales: np.ndarray):
+    """Polyline length, polygon area and closed perimeter for packed measurements.
+
+    Returns three arrays of length len(counts), in mm / mm² / mm. Measurements
+    without points get zeros.
+    """
+    m = len(counts)
+    distance = np.zeros(m)
+    area = np.zeros(m)
+    perimeter = np.zeros(m)
+    nonempty = counts > 0
+    if not nonempty.any():
+        return distance, area, perimeter
+
+    counts_ne = counts[nonempty]
+    starts = np.concatenate(([0], np.cumsum(counts_ne)[:-1]))
+    total = len(xy)
+
+    # Convert to mm up front, like pixelsToMm in the app
+    per_point_scale = np.repeat(scales[nonempty], counts_ne)
+    mm = xy / per_point_scale[:, None]
+
+    # Index of the next vertex, wrapping to the first one of each measurement
+    nxt = np.arange(1, total + 1)
+    last = starts + counts_ne - 1
+    nxt[last] = starts
+    is_last = np.zeros(total, dtype=bool)
+    is_last[last] = True
+
+    x, y = mm[:, 0], mm[:, 1]
+    xn, yn = x[nxt], y[nxt]
+    segment = np.hypot(xn - x, yn - y)
+    cross = x * yn - xn * y
+
+    perimeter[nonempty] = np.add.reduceat(segment, starts)
+    distance[nonempty] = np.add.reduceat(np.where(is_last, 0.0, segment), starts)
+    area[nonempty] = np.abs(np.add.reduceat(cross, starts)) / 2
+    return distance, area, perimeter
+
+
+def compute_results(
+    modes: Sequence[str],
+    point_lists: Sequence[Sequence[Sequence[float]]],
+    scales: Sequence[float],
+    heights: Optional[Sequence[Optional[float]]] = None,
+) -> List[Dict[str, float]]:
+    """MeasurementResult dicts for many measurements in one vectorized pass.
+
+    heights are the real-world heights (mm) of volume measurements; volume is
+    area × height and is left out when no height is known.
+    """
+    xy, counts = pack_points(point_lists)
+    distance, area, perimeter = measure(xy, counts, np.asarray(scales, dtype=np.float64))
+
+    results = []
+    for i, mode in enumerate(modes):
+        n = counts[i]
+        if mode == "distance" and n >= 2:
+            results.append({"distance": float(distance[i])})
+        elif mode in CLOSED_MODES and n >= 3:
+            result = {"area": float(area[i]), "perimeter": float(perimeter[i])}
+            height = heights[i] if heights is not None else None
+            if mode == "volume" and height is not None:
+                result["volume"] = float(area[i] * height)
+            results.append(result)
+        else:
+            results.append({})
+    return results
+
+
+LINEAR_FIELDS = ("distance", "perimeter")
+# Volume is area × a height the user typed in mm, so only its area part
+# depends on the calibration and it scales like area
+QUADRATIC_FIELDS = ("area", "volume")
+
+
+def rescale_result(result: Dict[str, Optional[float]], old_scale: float, new_scale: float) -> Dict[str, Optional[float]]:
+    """Rescale a stored MeasurementResult from one calibrationScale to another"""
+    factor = old_scale / new_scale
+    rescaled = dict(result)
+    for field in LINEAR_FIELDS:
+        if rescaled.get(field) is not None:
+            rescaled[field] *= factor
+    for field in QUADRATIC_FIELDS:
+        if rescaled.get(field) is not None:
+            rescaled[field] *= factor * factor
+    return rescaled
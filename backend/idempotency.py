@@ -0,0 +1,96 @@
+"""Idempotency-Key support for POST requests that mobile clients retry.
+
+The first request with a key claims it in Mongo and, once it succeeded,
+stores its response there; a retry with the same key gets the stored
+response back instead of creating a second resource. Keys expire through a
+TTL index on createdAt.
+"""
+import hashlib
+from datetime import datetime, timedelta, timezone
+from typing import Awaitable, Callable
+
+from bson import Binary
+from fastapi import HTTPException, Response
+from pymongo import ASCENDING, IndexModel
+from pymongo.errors import DuplicateKeyError
+
+KEY_MAX_LENGTH = 255
+
+PENDING = "pending"
+DONE = "done"
+
+
+def indexes(ttl_seconds: int):
+    return [
+        IndexModel([("key", ASCENDING)], unique=True, name="key_unique"),
+        IndexModel([("createdAt", ASCENDING)], expireAfterSeconds=ttl_seconds, name="created_at_ttl"),
+    ]
+
+
+def fingerprint(method: str, path: str, body: bytes) -> str:
+    """Identifies the request a key was first used with"""
+    digest = hashlib.sha256(f"{method} {path}\n".encode())
+    digest.update(body)
+    return digest.hexdigest()
+
+
+def stored_response(record) -> Response:
+    return Response(
+        content=bytes(record["body"]),
+        status_code=record["statusCode"],
+        media_type=record["mediaType"],
+        headers={"Idempotent-Replayed": "true"},
+    )
+
+
+async def run_once(
+    collection,
+    key: str,
+    request_fingerprint: str,
+    handler: Callable[[], Awaitable[Response]],
+    pending_timeout: float = 60.0,
+) -> Response:
+    """Run `handler` once per key and replay its response for every retry.
+
+    Only successful responses are stored; after an error the key is
+    released so that the client can try again. A key still pending after
+    `pending_timeout` seconds belongs to a request that died and is taken
+    over.
+    """
+    if not key or len(key) > KEY_MAX_LENGTH:
+        raise HTTPException(status_code=400, detail=f"Idempotency-Key must be 1 to {KEY_MAX_LENGTH} characters")
+
+    now = datetime.now(timezone.utc)
+    try:
+        await collection.insert_one({"key": key, "fingerprint": request_fingerprint, "status": PENDING, "createdAt": now})
+    except DuplicateKeyError:
+        record = await collection.find_one({"key": key})
+        if record is None:
+            # Expired between the insert and the lookup
+            raise HTTPException(status_code=409, detail="Idempotency-Key is being reused, retry the request")
+        if record["fingerprint"] != request_fingerprint:
+            raise HTTPException(status_code=422, detail="Idempotency-Key was already used for a different request")
+        if record["status"] == DONE:
+            return stored_response(record)
+        takeover = await collection.update_one(
+            {"key": key, "status": PENDING, "createdAt": {"$lt": now - timedelta(seconds=pending_timeout)}},
+            {"$set": {"createdAt": now}},
+        )
+        if not takeover.modified_count:
+            raise HTTPException(status_code=409, detail="A request with this Idempotency-Key is still in progress")
+
+    try:
+        response = await handler()
+    except BaseException:
+        await collection.delete_one({"key": key, "status": PENDING})
+        raise
+    if 200 <= response.status_code < 300:
+        await collection.update_one({"key": key}, {"$set": {
+            "status": DONE,
+            "statusCode": response.status_code,
+            "mediaType": response.media_type,
+            "body": Binary(response.body),
+        }})
+    else:
+        await collection.delete_one({"key": key, "status": PENDING})
+    return response
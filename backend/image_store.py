@@ -0,0 +1,94 @@
+import asyncio
+import hashlib
+import os
+import re
+import uuid
+from pathlib import Path
+from typing import AsyncIterator, Optional, Tuple
+
+CHUNK_SIZE = 64 * 1024
+
+IMAGE_ID_RE = re.compile(r"^[0-9a-f]{64}$")
+
+
+class EmptyImageError(ValueError):
+    """Raised by ImageStore.save_stream for an upload without any bytes"""
+
+
+def guess_media_type(head: bytes) -> str:
+    """Guess an image media type from the first bytes of the file"""
+    if head.startswith(b"\x89PNG\r\n\x1a\n"):
+        return "image/png"
+    if head.startswith(b"\xff\xd8"):
+        return "image/jpeg"
+    if head[:4] == b"RIFF" and head[8:12] == b"WEBP":
+        return "image/webp"
+    return "application/octet-stream"
+
+
+class ImageStore:
+    """Content-addressed image storage on local disk.
+
+    Images are stored under their SHA-256 digest, so uploading the same
+    bytes twice keeps a single file. Several measurements may reference the
+    same image, which is why deleting a measurement leaves the file alone.
+    """
+
+    def __init__(self, root: Path):
+        self.root = Path(root)
+        self.tmp_dir = self.root / "tmp"
+        self.tmp_dir.mkdir(parents=True, exist_ok=True)
+
+    def path(self, image_id: str) -> Path:
+        if not IMAGE_ID_RE.match(image_id):
+            raise ValueError("Invalid image id")
+        return self.root / image_id[:2] / image_id
+
+    def exists(self, image_id: str) -> bool:
+        try:
+            return self.path(image_id).is_file()
+        except ValueError:
+            return False
+
+    async def save_stream(self, chunks: AsyncIterator[bytes], max_size: Optional[int] = None) -> Tuple[str, int]:
+        """Write an upload to disk while hashing it; return (image_id, size)"""
+        digest = hashlib.sha256()
+        size = 0
+        tmp_path = self.tmp_dir / uuid.uuid4().hex
+        f = await asyncio.to_thread(open, tmp_path, "wb")
+        try:
+            async for chunk in chunks:
+                if not chunk:
+                    continue
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise ValueError("Image too large")
+                digest.update(chunk)
+                await asyncio.to_thread(f.write, chunk)
+            if size == 0:
+                raise EmptyImageError("Empty image")
+        except BaseException:
+            f.close()
+            tmp_path.unlink(missing_ok=True)
+            raise
+        f.close()
+        return await asyncio.to_thread(self._commit, tmp_path, digest.hexdigest()), size
+
+    async def save_bytes(self, data: bytes) -> Tuple[str, int]:
+        async def single():
+            yield data
+        return await self.save_stream(single())
+
+    def _commit(self, tmp_path: Path, image_id: str) -> str:
+        target = self.path(image_id)
+        if target.exists():
+            # Same content is already stored
+            tmp_path.unlink(missing_ok=True)
+        else:
+            target.parent.mkdir(exist_ok=True)
+            os.replace(tmp_path, target)
+        return image_id
+
+    def media_type(self, image_id: str) -> str:
+        with open(self.path(image_id), "rb") as f:
+            return guess_media_type(f.read(16))
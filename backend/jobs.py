@@ -0,0 +1,259 @@
+"""In-process background jobs for long running measurement operations.
+
+Jobs wait on an asyncio queue and are run by a fixed number of worker tasks
+inside the API process, so nothing besides MongoDB is needed. Their state
+lives in a Mongo collection, which makes status, progress and cancellation
+visible from every server process; a job itself only runs in the process
+that accepted it.
+
+Handlers are coroutines taking a JobContext. They report progress and call
+`checkpoint()` between batches: that is where a cancellation is noticed and
+where the event loop gets to serve interactive requests in between.
+"""
+import asyncio
+import logging
+import time
+import uuid
+from datetime import datetime, timedelta, timezone
+from pathlib import Path
+from typing import Any, Awaitable, Callable, Dict, Optional, Set, Tuple, Type
+
+from pymongo import ReturnDocument
+
+logger = logging.getLogger(__name__)
+
+QUEUED = "queued"
+RUNNING = "running"
+SUCCEEDED = "succeeded"
+FAILED = "failed"
+CANCELLED = "cancelled"
+FINISHED = (SUCCEEDED, FAILED, CANCELLED)
+
+PROJECTION = {"_id": 0}
+
+
+def utcnow() -> datetime:
+    return datetime.now(timezone.utc)
+
+
+class JobCancelled(Exception):
+    """Raised by JobContext.checkpoint once the job was cancelled"""
+
+
+class JobQueueFull(Exception):
+    """Raised by JobQueue.submit while max_queued jobs are waiting"""
+
+
+class JobContext:
+    """What a running handler gets: its parameters plus progress reporting"""
+
+    def __init__(self, queue: "JobQueue", job: Dict[str, Any]):
+        self.queue = queue
+        self.id = job["id"]
+        self.params = job["params"]
+        self.attempt = job["attempts"]
+
+    async def progress(self, **progress: Any):
+        """Store progress fields (e.g. done=, total=) and pick up cross-process cancellation"""
+        job = await self.queue.collection.find_one_and_update(
+            {"id": self.id},
+            {"$set": {**{f"progress.{k}": v for k, v in progress.items()}, "updatedAt": utcnow()}},
+            projection={"cancelRequested": 1},
+        )
+        if job and job.get("cancelRequested"):
+            self.queue._cancelled.add(self.id)
+
+    async def checkpoint(self):
+        """Raise JobCancelled if requested, otherwise let other tasks run"""
+        if self.id in self.queue._cancelled:
+            raise JobCancelled()
+        await asyncio.sleep(0)
+
+    def output_path(self, suffix: str) -> Path:
+        """File for a job's output, served by the download endpoint"""
+        return self.queue.output_dir / f"{self.id}{suffix}"
+
+
+Handler = Callable[[JobContext], Awaitable[Optional[Dict[str, Any]]]]
+
+
+class JobQueue:
+    """Bounded pool of worker tasks running registered job kinds.
+
+    Failures of the types in `retry_on` are retried up to `max_attempts`
+    times with exponential backoff, so handlers must be safe to run again.
+    """
+
+    def __init__(
+        self,
+        output_dir: Path,
+        workers: int = 2,
+        max_queued: int = 100,
+        max_attempts: int = 3,
+        retry_delay: float = 1.0,
+        retry_on: Tuple[Type[Exception], ...] = (Exception,),
+    ):
+        self.collection = None
+        self.output_dir = Path(output_dir)
+        self.workers = workers
+        self.max_queued = max_queued
+        self.max_attempts = max_attempts
+        self.retry_delay = retry_delay
+        self.retry_on = retry_on
+        self._handlers: Dict[str, Handler] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._tasks: Set[asyncio.Task] = set()
+        # Jobs of this process asked to stop at their next checkpoint
+        self._cancelled: Set[str] = set()
+
+    def register(self, kind: str, handler: Handler):
+        self._handlers[kind] = handler
+
+    async def start(self, collection, stale_after: Optional[float] = None, keep_outputs: Optional[float] = None):
+        """Start the workers on `collection`, first cleaning up after earlier runs.
+
+        Running jobs refresh updatedAt with every progress report; one that
+        has not done so for `stale_after` seconds is not coming back. Output
+        files older than `keep_outputs` seconds are deleted.
+        """
+        self.collection = collection
+        self.output_dir.mkdir(parents=True, exist_ok=True)
+        if keep_outputs is not None:
+            cutoff = time.time() - keep_outputs
+            for path in self.output_dir.iterdir():
+                if path.is_file() and path.stat().st_mtime < cutoff:
+                    path.unlink(missing_ok=True)
+        if stale_after is not None:
+            await self.collection.update_many(
+                {"status": {"$in": [QUEUED, RUNNING]}, "updatedAt": {"$lt": utcnow() - timedelta(seconds=stale_after)}},
+                {"$set": {"status": FAILED, "error": "Interrupted", "finishedAt": utcnow()}},
+            )
+        self._queue = asyncio.Queue()
+        for _ in range(self.workers):
+            self._spawn(self._work())
+
+    async def stop(self):
+        tasks = list(self._tasks)
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self._queue = None
+
+    async def submit(self, kind: str, params: Dict[str, Any]) -> Dict[str, Any]:
+        if kind not in self._handlers:
+            raise ValueError(f"Unknown job kind: {kind}")
+        if self._queue is None:
+            raise RuntimeError("Job queue is not running")
+        if self._queue.qsize() >= self.max_queued:
+            raise JobQueueFull()
+        now = utcnow()
+        job = {
+            "id": str(uuid.uuid4()),
+            "kind": kind,
+            "status": QUEUED,
+            "params": params,
+            "progress": {},
+            "attempts": 0,
+            "cancelRequested": False,
+            "error": None,
+            "result": None,
+            "createdAt": now,
+            "updatedAt": now,
+            "startedAt": None,
+            "finishedAt": None,
+        }
+        await self.collection.insert_one(job)
+        job.pop("_id", None)
+        self._queue.put_nowait(job["id"])
+        return job
+
+    async def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        return await self.collection.find_one({"id": job_id}, PROJECTION)
+
+    async def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Cancel a queued job right away, a running one at its next checkpoint"""
+        now = utcnow()
+        job = await self.collection.find_one_and_update(
+            {"id": job_id, "status": QUEUED},
+            {"$set": {"status": CANCELLED, "cancelRequested": True, "updatedAt": now, "finishedAt": now}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            job = await self.collection.find_one_and_update(
+                {"id": job_id, "status": RUNNING},
+                {"$set": {"cancelRequested": True}},
+                return_document=ReturnDocument.AFTER,
+            )
+            if job is not None:
+                self._cancelled.add(job_id)
+        if job is None:
+            return await self.get(job_id)
+        job.pop("_id", None)
+        return job
+
+    def _spawn(self, coroutine):
+        task = asyncio.create_task(coroutine)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _work(self):
+        while True:
+            job_id = await self._queue.get()
+            try:
+                await self._run(job_id)
+            except Exception:
+                logger.exception("Job %s could not be run", job_id)
+            finally:
+                self._cancelled.discard(job_id)
+
+    async def _requeue_later(self, job_id: str, delay: float):
+        await asyncio.sleep(delay)
+        if self._queue is not None:
+            self._queue.put_nowait(job_id)
+
+    async def _finish(self, job_id: str, status: str, **fields: Any):
+        now = utcnow()
+        await self.collection.update_one(
+            {"id": job_id},
+            {"$set": {"status": status, "updatedAt": now, "finishedAt": now, **fields}},
+        )
+
+    async def _run(self, job_id: str):
+        now = utcnow()
+        # Claiming the job atomically skips one cancelled while it was queued
+        job = await self.collection.find_one_and_update(
+            {"id": job_id, "status": QUEUED},
+            {"$set": {"status": RUNNING, "startedAt": now, "updatedAt": now}, "$inc": {"attempts": 1}},
+            return_document=ReturnDocument.AFTER,
+        )
+        if job is None:
+            return
+        job.pop("_id", None)
+        if job.get("cancelRequested"):
+            await self._finish(job_id, CANCELLED)
+            return
+
+        try:
+            result = await self._handlers[job["kind"]](JobContext(self, job))
+        except JobCancelled:
+            await self._finish(job_id, CANCELLED)
+        except asyncio.CancelledError:
+            # Server shutdown; leave a final state instead of a job that looks alive
+            await asyncio.shield(self._finish(job_id, FAILED, error="Interrupted by shutdown"))
+            raise
+        except self.retry_on as e:
+            if job["attempts"] >= self.max_attempts:
+                logger.exception("Job %s (%s) failed", job_id, job["kind"])
+                await self._finish(job_id, FAILED, error=str(e) or type(e).__name__)
+                return
+            logger.warning("Job %s (%s) failed on attempt %d, retrying: %s", job_id, job["kind"], job["attempts"], e)
+            await self.collection.update_one(
+                {"id": job_id},
+                {"$set": {"status": QUEUED, "error": str(e) or type(e).__name__, "updatedAt": utcnow()}},
+            )
+            self._spawn(self._requeue_later(job_id, self.retry_delay * 2 ** (job["attempts"] - 1)))
+        except Exception as e:
+            logger.exception("Job %s (%s) failed", job_id, job["kind"])
+            await self._finish(job_id, FAILED, error=str(e) or type(e).__name__)
+        else:
+            await self._finish(job_id, SUCCEEDED, result=result, error=None)
@@ -0,0 +1,165 @@
+"""Request and MongoDB command metrics in the Prometheus text format.
+
+Kept dependency free and cheap enough to leave on in production: every
+observation is a bisect plus a few additions under a lock. The lock is
+needed because pymongo reports command events from Motor's executor threads.
+"""
+import bisect
+import threading
+import time
+from typing import Dict, List, Sequence, Tuple
+
+from pymongo import monitoring
+
+LATENCY_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SIZE_BUCKETS = (256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216)
+
+
+def format_labels(names: Sequence[str], values: Sequence[str]) -> str:
+    if not names:
+        return ""
+    escaped = (str(v).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n") for v in values)
+    return "{" + ",".join(f'{n}="{v}"' for n, v in zip(names, escaped)) + "}"
+
+
+class Counter:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values: str, amount: float = 1.0):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0.0) + amount
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            values = list(self._values.items())
+        for label_values, value in values:
+            lines.append(f"{self.name}{format_labels(self.labels, label_values)} {value}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name: str, help: str, labels: Sequence[str] = (), buckets: Sequence[float] = LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last one is +Inf), sum, count]
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, *label_values: str):
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(label_values)
+            if series is None:
+                series = self._series[label_values] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+            series[0][index] += 1
+            series[1] += value
+            series[2] += 1
+
+    def render(self) -> List[str]:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(k, list(v[0]), v[1], v[2]) for k, v in self._series.items()]
+        for label_values, counts, total, count in series:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += bucket_count
+                le = "+Inf" if bound == float("inf") else repr(bound)
+                labels = format_labels(self.labels + ("le",), label_values + (le,))
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = format_labels(self.labels, label_values)
+            lines.append(f"{self.name}_sum{labels} {total}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class Metrics:
+    """All metrics exposed on /api/metrics"""
+
+    def __init__(self):
+        self.requests = Counter(
+            "http_requests_total", "HTTP requests by route and status code", ("method", "route", "status"))
+        self.request_duration = Histogram(
+            "http_request_duration_seconds", "Time to the last response byte", ("method", "route"))
+        self.request_size = Histogram(
+            "http_request_size_bytes", "Request body size from Content-Length", ("method", "route"), SIZE_BUCKETS)
+        self.response_size = Histogram(
+            "http_response_size_bytes", "Response body size", ("method", "route"), SIZE_BUCKETS)
+        self.mongo_duration = Histogram(
+            "mongodb_command_duration_seconds", "MongoDB command round trip time", ("command",))
+        self.mongo_failures = Counter(
+            "mongodb_command_failures_total", "Failed MongoDB commands", ("command",))
+
+    def render(self) -> str:
+        families = (self.requests, self.request_duration, self.request_size,
+                    self.response_size, self.mongo_duration, self.mongo_failures)
+        return "\n".join(line for family in families for line in family.render()) + "\n"
+
+
+class MetricsMiddleware:
+    """ASGI middleware recording latency, sizes and status per route template"""
+
+    def __init__(self, app, metrics: Metrics):
+        self.app = app
+        self.metrics = metrics
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        start = time.perf_counter()
+        status = 500
+        response_size = 0
+        # Read up front; CompressionMiddleware rewrites it for decoded bodies
+        request_size = None
+        for name, value in scope.get("headers", []):
+            if name == b"content-length" and value.isdigit():
+                request_size = int(value)
+                break
+
+        async def send_wrapper(message):
+            nonlocal status, response_size
+            if message["type"] == "http.response.start":
+                status = message["status"]
+            elif message["type"] == "http.response.body":
+                response_size += len(message.get("body", b""))
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            # The router stores the matched route in the scope; using its
+            # template keeps ids out of the label values
+            route = scope.get("route")
+            route_label = getattr(route, "path", "unmatched")
+            method = scope["method"]
+            self.metrics.requests.inc(method, route_label, str(status))
+            self.metrics.request_duration.observe(time.perf_counter() - start, method, route_label)
+            self.metrics.response_size.observe(response_size, method, route_label)
+            if request_size is not None:
+                self.metrics.request_size.observe(request_size, method, route_label)
+
+
+class CommandMetrics(monitoring.CommandListener):
+    """pymongo command listener feeding Metrics; pass it to the Motor client"""
+
+    def __init__(self, metrics: Metrics):
+        self.metrics = metrics
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        self.metrics.mongo_duration.observe(event.duration_micros / 1e6, event.command_name)
+
+    def failed(self, event):
+        self.metrics.mongo_duration.observe(event.duration_micros / 1e6, event.command_name)
+        self.metrics.mongo_failures.inc(event.command_name)
@@ -0,0 +1,64 @@
+"""Packed storage and wire format for measurement points.
+
+Points are stored as one BinData field of little-endian float64 pairs
+(x0, y0, x1, y1, ...) in `pointsXY` plus the point ids in `pointIds`,
+instead of an array of {x, y, id} sub-documents. Documents written before
+that still carry `points`; every reader goes through this module so both
+forms are accepted.
+"""
+from typing import Any, Dict, List, Optional, Sequence
+
+import numpy as np
+from bson import Binary
+
+STORAGE_DTYPE = np.dtype("<f8")
+WIRE_DTYPES = {"f4": np.dtype("<f4"), "f8": np.dtype("<f8")}
+
+PACKED_FIELDS = ("pointsXY", "pointIds")
+
+
+def decode_wire_points(data: bytes, dtype: str = "f8") -> np.ndarray:
+    """View packed x, y pairs from a request as an (N, 2) array without copying"""
+    if dtype not in WIRE_DTYPES:
+        raise ValueError("pointsDtype must be f4 or f8")
+    itemsize = WIRE_DTYPES[dtype].itemsize
+    if len(data) % (2 * itemsize):
+        raise ValueError("pointsXY length is not a whole number of x, y pairs")
+    return np.frombuffer(data, dtype=WIRE_DTYPES[dtype]).reshape(-1, 2)
+
+
+def default_point_ids(count: int) -> List[str]:
+    return [str(i) for i in range(count)]
+
+
+def encode_points(xy: np.ndarray, ids: Sequence[str]) -> Dict[str, Any]:
+    """Mongo fields storing points compactly"""
+    return {
+        "pointsXY": Binary(np.ascontiguousarray(xy, dtype=STORAGE_DTYPE).tobytes()),
+        "pointIds": list(ids),
+    }
+
+
+def points_xy(doc: Dict[str, Any]) -> np.ndarray:
+    """(N, 2) array of a stored measurement's points, in either storage form"""
+    if "pointsXY" in doc:
+        return np.frombuffer(doc["pointsXY"], dtype=STORAGE_DTYPE).reshape(-1, 2)
+    return np.array([(p["x"], p["y"]) for p in doc.get("points", [])], dtype=STORAGE_DTYPE).reshape(-1, 2)
+
+
+def expand_points(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Replace packed points by the JSON [{x, y, id}] form, in place"""
+    if "pointsXY" in doc:
+        xy = points_xy(doc).tolist()
+        ids: Optional[List[str]] = doc.pop("pointIds", None) or default_point_ids(len(xy))
+        del doc["pointsXY"]
+        doc["points"] = [{"x": x, "y": y, "id": i} for (x, y), i in zip(xy, ids)]
+    return doc
+
+
+def projection_with_points(projection: Dict[str, int]) -> Dict[str, int]:
+    """Extend a Mongo projection that names `points` to the packed fields too"""
+    if "points" in projection:
+        for field in PACKED_FIELDS:
+            projection[field] = projection["points"]
+    return projection
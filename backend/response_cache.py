@@ -0,0 +1,80 @@
+import hashlib
+import time
+from collections import OrderedDict
+from typing import Dict, Optional, Tuple
+
+
+class CachedBody:
+    """A pre-serialized response body with its strong ETag"""
+
+    def __init__(self, body: bytes, media_type: str, headers: Optional[Dict[str, str]] = None):
+        self.body = body
+        self.media_type = media_type
+        self.headers = headers or {}
+        self.etag = '"' + hashlib.sha256(body).hexdigest()[:32] + '"'
+
+    def matches(self, if_none_match: Optional[str]) -> bool:
+        """Weak comparison against an If-None-Match header, as RFC 9110 asks for.
+
+        Compressed responses carry the ETag as W/"...", and clients send it
+        back in that form.
+        """
+        if not if_none_match:
+            return False
+        tags = [tag.strip().removeprefix("W/") for tag in if_none_match.split(",")]
+        return "*" in tags or self.etag in tags
+
+
+class ResponseCache:
+    """Size bounded LRU with TTL for serialized measurement responses.
+
+    Entries are grouped per measurement id so that every variant (plain GET,
+    each export format) is dropped together on invalidation. The cache is per
+    process; with several workers the TTL bounds how long another worker can
+    serve a measurement that was changed elsewhere.
+    """
+
+    def __init__(self, max_entries: int = 1024, ttl: float = 60.0):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self._entries: "OrderedDict[str, Dict[str, Tuple[float, CachedBody]]]" = OrderedDict()
+        self._size = 0
+        # Bumped on every invalidation so that a render that raced with it is not stored
+        self.version = 0
+
+    def get(self, key: str, variant: str) -> Optional[CachedBody]:
+        variants = self._entries.get(key)
+        if not variants or variant not in variants:
+            return None
+        expires_at, body = variants[variant]
+        if expires_at < time.monotonic():
+            del variants[variant]
+            self._size -= 1
+            if not variants:
+                del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return body
+
+    def put(self, key: str, variant: str, body: CachedBody, version: int):
+        if self.max_entries <= 0 or version != self.version:
+            return
+        variants = self._entries.setdefault(key, {})
+        if variant not in variants:
+            self._size += 1
+        variants[variant] = (time.monotonic() + self.ttl, body)
+        self._entries.move_to_end(key)
+        while self._size > self.max_entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._size -= len(evicted)
+
+    def invalidate(self, key: str):
+        self.version += 1
+        variants = self._entries.pop(key, None)
+        if variants:
+            self._size -= len(variants)
+
+    def clear(self):
+        self.version += 1
+        self._entries.clear()
+        self._size = 0
@@ -1,26 +1,190 @@
-from fastapi import FastAPI, APIRouter, HTTPException
+from fastapi import FastAPI, APIRouter, Depends, HTTPException, Query, Request, Response
+from fastapi.exceptions import RequestValidationError
+from fastapi.responses import FileResponse, StreamingResponse
 from dotenv import load_dotenv
 from starlette.middleware.cors import CORSMiddleware
 from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import ASCENDING, DESCENDING, TEXT, IndexModel, ReturnDocument, UpdateOne
+from pymongo.errors import BulkWriteError, PyMongoError
 import os
 import logging
+from contextlib import asynccontextmanager
 from pathlib import Path
-from pydantic import BaseModel, Field
-from typing import List, Optional, Dict, Any
+from pydantic import BaseModel, Field, ValidationError
+from typing import List, Optional, Dict, Any, AsyncIterator, Tuple
 import uuid
-from datetime import datetime
+import re
+import numpy as np
+import msgpack
+import orjson
+import asyncio
+import csv
+import io
+import json
+import base64
+import binascii
+from datetime import datetime, timedelta, timezone
 
+from compression import CompressionMiddleware
+from geometry import compute_results, rescale_result
+import idempotency
+from image_store import EmptyImageError, ImageStore, guess_media_type
+from jobs import SUCCEEDED, JobContext, JobQueue, JobQueueFull
+from point_codec import decode_wire_points, default_point_ids, encode_points, expand_points, points_xy, projection_with_points
+from metrics import CommandMetrics, Metrics, MetricsMiddleware
+from response_cache import CachedBody, ResponseCache
+from thumbnails import VARIANTS, ImageTooLargeError, Thumbnailer
 
 ROOT_DIR = Path(__file__).parent
 load_dotenv(ROOT_DIR / '.env')
 
-# MongoDB connection
+# Serialize list responses straight from the Mongo documents with orjson,
+# skipping pydantic reconstruction and response_model validation
+FAST_JSON = os.environ.get('FAST_JSON', '').lower() in ('1', 'true', 'yes')
+
+# Request and MongoDB command metrics, served on /api/metrics
+metrics = Metrics()
+
+# MongoDB connection, opened per worker process in lifespan(). Pool settings
+# left unset keep the pymongo default or whatever MONGO_URL specifies.
 mongo_url = os.environ['MONGO_URL']
-client = AsyncIOMotorClient(mongo_url)
-db = client[os.environ['DB_NAME']]
+MONGO_POOL_ENV = {
+    'maxPoolSize': 'MONGO_MAX_POOL_SIZE',
+    'minPoolSize': 'MONGO_MIN_POOL_SIZE',
+    'maxIdleTimeMS': 'MONGO_MAX_IDLE_TIME_MS',
+    'waitQueueTimeoutMS': 'MONGO_WAIT_QUEUE_TIMEOUT_MS',
+    'connectTimeoutMS': 'MONGO_CONNECT_TIMEOUT_MS',
+    'socketTimeoutMS': 'MONGO_SOCKET_TIMEOUT_MS',
+    'serverSelectionTimeoutMS': 'MONGO_SERVER_SELECTION_TIMEOUT_MS',
+}
+MONGO_CLIENT_OPTIONS: Dict[str, Any] = {
+    option: int(os.environ[name]) for option, name in MONGO_POOL_ENV.items() if os.environ.get(name)
+}
+if os.environ.get('MONGO_READ_PREFERENCE'):
+    # e.g. secondaryPreferred; reads may then lag behind the writes before them
+    MONGO_CLIENT_OPTIONS['readPreference'] = os.environ['MONGO_READ_PREFERENCE']
+
+client: Optional[AsyncIOMotorClient] = None
+db = None
+
+def create_client() -> AsyncIOMotorClient:
+    return AsyncIOMotorClient(mongo_url, event_listeners=[CommandMetrics(metrics)], **MONGO_CLIENT_OPTIONS)
+
+# Measurement images live outside of Mongo, addressed by their SHA-256
+image_store = ImageStore(Path(os.environ.get('IMAGE_STORE_DIR', ROOT_DIR / 'images')))
+MAX_IMAGE_SIZE = int(os.environ.get('MAX_IMAGE_SIZE', 20 * 1024 * 1024))
+thumbnailer = Thumbnailer(
+    image_store,
+    workers=int(os.environ.get('IMAGE_WORKERS', 2)),
+    max_pixels=int(os.environ.get('IMAGE_MAX_PIXELS', 50_000_000)),
+)
+
+# Serialized single-measurement responses, invalidated on every write
+measurement_cache = ResponseCache(
+    max_entries=int(os.environ.get('CACHE_MAX_ENTRIES', 1024)),
+    ttl=float(os.environ.get('CACHE_TTL_SECONDS', 60)),
+)
+
+# Long running operations (recalibrate, recompute, exports, image
+# derivatives) as background jobs on a small worker pool, see jobs.py.
+# Only database and file errors are retried; handlers are safe to rerun.
+JOB_RETENTION_SECONDS = int(os.environ.get('JOB_RETENTION_SECONDS', 7 * 24 * 3600))
+# A running job without a progress report for this long died with its process
+JOB_STALE_SECONDS = int(os.environ.get('JOB_STALE_SECONDS', 600))
+job_queue = JobQueue(
+    Path(os.environ.get('JOB_OUTPUT_DIR', ROOT_DIR / 'job_output')),
+    workers=int(os.environ.get('JOB_WORKERS', 2)),
+    max_queued=int(os.environ.get('JOB_MAX_QUEUED', 100)),
+    max_attempts=int(os.environ.get('JOB_MAX_ATTEMPTS', 3)),
+    retry_on=(PyMongoError, OSError),
+)
+
+# Indexes for every query the endpoints below run on measurements
+TEXT_LANGUAGE = "none"
+MEASUREMENT_INDEXES = [
+    IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+    IndexModel([("timestamp", DESCENDING), ("id", DESCENDING)], name="timestamp_id"),
+    IndexModel([("mode", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="mode_timestamp_id"),
+    IndexModel([("unit", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="unit_timestamp_id"),
+    IndexModel([("name", ASCENDING), ("timestamp", DESCENDING)], name="name_timestamp"),
+    IndexModel([("calibrationScale", ASCENDING)], name="calibration_scale"),
+    # Names are mostly German; no language specific stemming or stop words
+    IndexModel([("name", TEXT)], name="name_text", default_language=TEXT_LANGUAGE),
+    IndexModel([("result.distance", ASCENDING)], name="result_distance"),
+    IndexModel([("result.area", ASCENDING)], name="result_area"),
+    IndexModel([("result.volume", ASCENDING)], name="result_volume"),
+    IndexModel([("result.perimeter", ASCENDING)], name="result_perimeter"),
+    IndexModel([("seq", ASCENDING)], name="seq"),
+    IndexModel([("project", ASCENDING), ("timestamp", DESCENDING), ("id", DESCENDING)], name="project_timestamp_id"),
+    IndexModel([("tags", ASCENDING)], name="tags"),
+]
+
+# Delta sync: every measurement write takes the next value of a change
+# sequence, deletes leave a tombstone. Tombstones are kept for
+# TOMBSTONE_RETENTION_SECONDS; older sync tokens get a full resync.
+TOMBSTONE_RETENTION_SECONDS = int(os.environ.get('TOMBSTONE_RETENTION_SECONDS', 30 * 24 * 3600))
+# Changes younger than this may still have in-flight writes with lower
+# sequence numbers, so the sync token does not move past them yet
+SYNC_SETTLE_MS = int(os.environ.get('SYNC_SETTLE_MS', 5000))
+
+TOMBSTONE_INDEXES = [
+    IndexModel([("seq", ASCENDING)], name="seq"),
+    IndexModel([("deletedAt", ASCENDING)], expireAfterSeconds=TOMBSTONE_RETENTION_SECONDS, name="deleted_at_ttl"),
+]
+
+# Raw heartbeats expire after STATUS_RETENTION_SECONDS; hourly per-client
+# buckets are kept for STATUS_BUCKET_RETENTION_SECONDS
+STATUS_RETENTION_SECONDS = int(os.environ.get('STATUS_RETENTION_SECONDS', 7 * 24 * 3600))
+STATUS_BUCKET_RETENTION_SECONDS = int(os.environ.get('STATUS_BUCKET_RETENTION_SECONDS', 90 * 24 * 3600))
+STATUS_BUCKET_SIZE = timedelta(hours=1)
+
+STATUS_INDEXES = {
+    "status_checks": [
+        IndexModel([("timestamp", ASCENDING)], expireAfterSeconds=STATUS_RETENTION_SECONDS, name="timestamp_ttl"),
+        IndexModel([("client_name", ASCENDING), ("timestamp", DESCENDING)], name="client_timestamp"),
+    ],
+    "status_buckets": [
+        IndexModel([("client_name", ASCENDING), ("bucket", ASCENDING)], unique=True, name="client_bucket"),
+        IndexModel([("bucket", ASCENDING)], expireAfterSeconds=STATUS_BUCKET_RETENTION_SECONDS, name="bucket_ttl"),
+    ],
+    "status_clients": [
+        IndexModel([("client_name", ASCENDING)], unique=True, name="client_name_unique"),
+    ],
+}
+
+# Idempotency-Key records for POST /measurements; a retry after this long
+# creates a new measurement
+IDEMPOTENCY_TTL_SECONDS = int(os.environ.get('IDEMPOTENCY_TTL_SECONDS', 24 * 3600))
+# A key still pending after this long belongs to a request that died
+IDEMPOTENCY_PENDING_SECONDS = int(os.environ.get('IDEMPOTENCY_PENDING_SECONDS', 60))
+
+# Finished jobs are dropped after JOB_RETENTION_SECONDS
+JOB_INDEXES = [
+    IndexModel([("id", ASCENDING)], unique=True, name="id_unique"),
+    IndexModel([("createdAt", DESCENDING)], name="created_at"),
+    IndexModel([("status", ASCENDING), ("createdAt", DESCENDING)], name="status_created_at"),
+    IndexModel([("finishedAt", ASCENDING)], expireAfterSeconds=JOB_RETENTION_SECONDS, name="finished_at_ttl"),
+]
+
+# Newest first; id breaks ties between measurements of the same millisecond
+PAGE_SORT = [("timestamp", DESCENDING), ("id", DESCENDING)]
+
+# Bulk ingest limits
+MAX_BATCH_ITEMS = 5000
+MAX_BATCH_BODY_SIZE = int(os.environ.get('MAX_BATCH_BODY_SIZE', 64 * 1024 * 1024))
+WRITE_CHUNK_SIZE = 500
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    """Runs once per worker process, so every worker has its own connection pool"""
+    await startup()
+    try:
+        yield
+    finally:
+        await shutdown()
 
 # Create the main app without a prefix
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # Create a router with the /api prefix
 api_router = APIRouter(prefix="/api")
@@ -35,6 +199,26 @@ class StatusCheck(BaseModel):
 class StatusCheckCreate(BaseModel):
     client_name: str
 
+class SyncResponse(BaseModel):
+    # Pass back as `token` on the next sync
+    token: str
+    # The client must drop its local copy before applying `changed`
+    reset: bool
+    hasMore: bool
+    changed: List[Dict[str, Any]]
+    deleted: List[str]
+
+class StatusClientSummary(BaseModel):
+    client_name: str
+    count: int
+    firstSeen: datetime
+    lastSeen: datetime
+
+class StatusBucket(BaseModel):
+    client_name: str
+    bucket: datetime
+    count: int
+
 class Point(BaseModel):
     x: float
     y: float
@@ -55,102 +239,1291 @@ class Measurement(BaseModel):
     result: MeasurementResult
     unit: str
     timestamp: int
-    imageData: Optional[str] = None
+    imageId: Optional[str] = None
+    project: Optional[str] = None
+    tags: List[str] = []
 
 class MeasurementCreate(BaseModel):
     name: str
     mode: str
     points: List[Point]
-    calibrationScale: float
+    calibrationScale: float = Field(gt=0)
     result: MeasurementResult
     unit: str
+    imageId: Optional[str] = None
+    project: Optional[str] = None
+    tags: List[str] = []
+    # Legacy inline base64 image, moved into the image store on create
     imageData: Optional[str] = None
 
+class ResultStats(BaseModel):
+    total: float
+    min: Optional[float] = None
+    max: Optional[float] = None
+
+class GroupSummary(BaseModel):
+    # Project name, tag or mode, depending on the endpoint; None for
+    # measurements without a project
+    key: Optional[str] = None
+    count: int
+    distance: ResultStats
+    area: ResultStats
+    volume: ResultStats
+    perimeter: ResultStats
+    firstTimestamp: int
+    lastTimestamp: int
+
+class ImageUpload(BaseModel):
+    imageId: str
+    size: int
+
+class BatchItemResult(BaseModel):
+    index: int
+    id: Optional[str] = None
+    error: Optional[str] = None
+
+class BatchResult(BaseModel):
+    created: int
+    failed: int
+    results: List[BatchItemResult]
+
+class RecomputeRequest(BaseModel):
+    ids: List[str] = Field(max_length=MAX_BATCH_ITEMS)
+    # Optional corrected scale applied to every listed measurement
+    calibrationScale: Optional[float] = Field(None, gt=0)
+
+class RecomputeItem(BaseModel):
+    id: str
+    calibrationScale: float
+    result: MeasurementResult
+
+class RecomputeResult(BaseModel):
+    updated: int
+    missing: List[str]
+    results: List[RecomputeItem]
+
+class RecalibrationFilter(BaseModel):
+    minScale: Optional[float] = None
+    maxScale: Optional[float] = None
+    # Millisecond timestamps, like Measurement.timestamp
+    since: Optional[int] = None
+    until: Optional[int] = None
+
+    def to_query(self) -> Dict[str, Any]:
+        query: Dict[str, Any] = {}
+        if self.minScale is not None or self.maxScale is not None:
+            query["calibrationScale"] = {}
+            if self.minScale is not None:
+                query["calibrationScale"]["$gte"] = self.minScale
+            if self.maxScale is not None:
+                query["calibrationScale"]["$lte"] = self.maxScale
+        if self.since is not None or self.until is not None:
+            query["timestamp"] = {}
+            if self.since is not None:
+                query["timestamp"]["$gte"] = self.since
+            if self.until is not None:
+                query["timestamp"]["$lt"] = self.until
+        return query
+
+class RecalibrateRequest(BaseModel):
+    filter: RecalibrationFilter
+    calibrationScale: float = Field(gt=0)
+
+class MeasurementQuery(BaseModel):
+    """The measurement list filters as a request body, for background jobs"""
+    mode: Optional[str] = None
+    unit: Optional[str] = None
+    project: Optional[str] = None
+    tag: Optional[str] = None
+    since: Optional[int] = None
+    until: Optional[int] = None
+    namePrefix: Optional[str] = None
+    q: Optional[str] = None
+    minDistance: Optional[float] = None
+    maxDistance: Optional[float] = None
+    minArea: Optional[float] = None
+    maxArea: Optional[float] = None
+    minVolume: Optional[float] = None
+    maxVolume: Optional[float] = None
+    minPerimeter: Optional[float] = None
+    maxPerimeter: Optional[float] = None
+
+    def to_query(self) -> Dict[str, Any]:
+        return measurement_filter(**self.dict())
+
+class RecomputeJobRequest(BaseModel):
+    filter: MeasurementQuery = MeasurementQuery()
+    calibrationScale: Optional[float] = Field(None, gt=0)
+
+class ExportJobRequest(BaseModel):
+    filter: MeasurementQuery = MeasurementQuery()
+    format: str = "csv"
+    points: bool = False
+
+class ThumbnailJobRequest(BaseModel):
+    filter: MeasurementQuery = MeasurementQuery()
+
+class Job(BaseModel):
+    id: str
+    kind: str
+    status: str
+    params: Dict[str, Any]
+    progress: Dict[str, Any]
+    attempts: int
+    cancelRequested: bool
+    error: Optional[str] = None
+    result: Optional[Dict[str, Any]] = None
+    createdAt: datetime
+    updatedAt: datetime
+    startedAt: Optional[datetime] = None
+    finishedAt: Optional[datetime] = None
+
+def raw_json_response(content: Any, headers: Optional[Dict[str, str]] = None) -> Response:
+    """Encode already projected Mongo documents with orjson (see FAST_JSON)"""
+    headers = {k: v for k, v in (headers or {}).items() if k.lower() != "content-length"}
+    return Response(content=orjson.dumps(content), media_type="application/json", headers=headers)
+
 # Add your routes to the router instead of directly to app
 @api_router.get("/")
 async def root():
     return {"message": "AR Mess-App API"}
 
+def status_bucket(timestamp: datetime) -> datetime:
+    """Start of the bucket holding a (naive UTC, like StatusCheck) timestamp"""
+    if timestamp.tzinfo is not None:
+        timestamp = timestamp.astimezone(timezone.utc).replace(tzinfo=None)
+    return timestamp - (timestamp - datetime.min) % STATUS_BUCKET_SIZE
+
 @api_router.post("/status", response_model=StatusCheck)
 async def create_status_check(input: StatusCheckCreate):
     status_dict = input.dict()
     status_obj = StatusCheck(**status_dict)
-    _ = await db.status_checks.insert_one(status_obj.dict())
+    seen = status_obj.timestamp
+    # Keep the raw event plus the aggregates the summary endpoints read
+    await asyncio.gather(
+        db.status_checks.insert_one(status_obj.dict()),
+        db.status_buckets.update_one(
+            {"client_name": status_obj.client_name, "bucket": status_bucket(seen)},
+            {"$inc": {"count": 1}},
+            upsert=True,
+        ),
+        db.status_clients.update_one(
+            {"client_name": status_obj.client_name},
+            {"$inc": {"count": 1}, "$max": {"lastSeen": seen}, "$min": {"firstSeen": seen}},
+            upsert=True,
+        ),
+    )
     return status_obj
 
 @api_router.get("/status", response_model=List[StatusCheck])
-async def get_status_checks():
-    status_checks = await db.status_checks.find().to_list(1000)
+async def get_status_checks(
+    client_name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=1000),
+):
+    """Raw heartbeats within the retention window, newest first"""
+    query: Dict[str, Any] = {}
+    if client_name:
+        query["client_name"] = client_name
+    if since:
+        query["timestamp"] = {"$gte": since}
+    cursor = db.status_checks.find(query, {"_id": 0}).sort("timestamp", DESCENDING).limit(limit)
+    status_checks = await cursor.to_list(limit)
+    if FAST_JSON:
+        return raw_json_response(status_checks)
     return [StatusCheck(**status_check) for status_check in status_checks]
 
+@api_router.get("/status/summary", response_model=List[StatusClientSummary])
+async def get_status_summary():
+    """One row per client: heartbeat count and first/last seen time"""
+    clients = await db.status_clients.find({}, {"_id": 0}).sort("lastSeen", DESCENDING).to_list(None)
+    return [StatusClientSummary(**c) for c in clients]
+
+@api_router.get("/status/buckets", response_model=List[StatusBucket])
+async def get_status_buckets(
+    client_name: Optional[str] = None,
+    since: Optional[datetime] = None,
+    limit: int = Query(1000, ge=1, le=10000),
+):
+    """Hourly heartbeat counts per client, newest first"""
+    query: Dict[str, Any] = {}
+    if client_name:
+        query["client_name"] = client_name
+    if since:
+        query["bucket"] = {"$gte": status_bucket(since)}
+    cursor = db.status_buckets.find(query, {"_id": 0}).sort("bucket", DESCENDING).limit(limit)
+    return [StatusBucket(**b) for b in await cursor.to_list(limit)]
+
 # Measurement endpoints
-@api_router.post("/measurements", response_model=Measurement)
-async def create_measurement(measurement_data: MeasurementCreate):
-    """Create a new measurement"""
-    measurement = Measurement(
-        id=str(uuid.uuid4()),
-        timestamp=int(datetime.now().timestamp() * 1000),
-        **measurement_data.dict()
+def now_ms() -> int:
+    return int(datetime.now().timestamp() * 1000)
+
+async def reserve_seq(count: int = 1) -> int:
+    """Reserve `count` consecutive change sequence numbers and return the first"""
+    counter = await db.counters.find_one_and_update(
+        {"_id": "measurements"},
+        {"$inc": {"seq": count}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
     )
-    
-    await db.measurements.insert_one(measurement.dict())
+    return counter["seq"] - count + 1
+
+def change_fields(seq: int) -> Dict[str, int]:
+    return {"seq": seq, "changedAt": now_ms()}
+
+async def build_measurement(measurement_data: MeasurementCreate, timestamp: int) -> Measurement:
+    data = measurement_data.dict(exclude={"imageData"})
+    if measurement_data.imageData:
+        data["imageId"] = await store_inline_image(measurement_data.imageData)
+    elif data["imageId"] and not image_store.exists(data["imageId"]):
+        raise HTTPException(status_code=400, detail="Unknown imageId")
+    return Measurement(id=str(uuid.uuid4()), timestamp=timestamp, **data)
+
+def measurement_document(measurement: Measurement, seq: int, xy=None, point_ids=None) -> Dict[str, Any]:
+    """Mongo document for a new measurement, with its points packed"""
+    if xy is None:
+        xy = [(p.x, p.y) for p in measurement.points]
+        point_ids = [p.id for p in measurement.points]
+    return {
+        **measurement.dict(exclude={"points"}),
+        **encode_points(np.asarray(xy, dtype=float).reshape(-1, 2), point_ids),
+        **change_fields(seq),
+    }
+
+def volume_height(volume: Optional[float], area: Optional[float]) -> Optional[float]:
+    """Height the client entered for a volume, recovered as volume / area"""
+    if volume is not None and area:
+        return volume / area
+    return None
+
+def apply_geometry(measurements: List[Measurement]):
+    """Replace client supplied results with server computed ones"""
+    results = compute_results(
+        [m.mode for m in measurements],
+        [[(p.x, p.y) for p in m.points] for m in measurements],
+        [m.calibrationScale for m in measurements],
+        [volume_height(m.result.volume, m.result.area) for m in measurements],
+    )
+    for measurement, result in zip(measurements, results):
+        measurement.result = MeasurementResult(**result)
+
+MSGPACK_TYPES = ("application/msgpack", "application/x-msgpack")
+
+def body_validation_error(e: ValidationError) -> RequestValidationError:
+    """Report a manually validated body the way FastAPI reports its own"""
+    return RequestValidationError([{**err, "loc": ("body", *err["loc"])} for err in e.errors(include_url=False)])
+
+def request_body_schema(model) -> Dict[str, Any]:
+    """OpenAPI request body for endpoints that read the body themselves"""
+    schema = model.model_json_schema(ref_template="#/components/schemas/{model}")
+    schema.pop("$defs", None)
+    return {"requestBody": {"required": True, "content": {"application/json": {"schema": schema}}}}
+
+@api_router.post("/measurements", response_model=Measurement, openapi_extra=request_body_schema(MeasurementCreate))
+async def create_measurement(request: Request):
+    """Create a new measurement.
+
+    Takes a JSON MeasurementCreate, or the same fields as MessagePack
+    (application/msgpack) with the points packed: `pointsXY` as binary
+    little-endian x, y pairs, `pointsDtype` "f4" or "f8" (default) and an
+    optional `pointIds` list. A MessagePack request gets a MessagePack
+    response with the points packed the same way.
+
+    With an Idempotency-Key header, a retry of the same request returns the
+    stored response of the first one (Idempotent-Replayed: true) instead of
+    creating a duplicate. Reusing a key for a different body is a 422.
+    """
+    body = await request.body()
+    key = request.headers.get("idempotency-key")
+    if key is not None:
+        # Retried uploads with the same key get the first response back
+        return await idempotency.run_once(
+            db.idempotency_keys, key,
+            idempotency.fingerprint(request.method, request.url.path, body),
+            lambda: store_measurement(request, body, serialize=True),
+            pending_timeout=IDEMPOTENCY_PENDING_SECONDS,
+        )
+    return await store_measurement(request, body)
+
+async def store_measurement(request: Request, body: bytes, serialize: bool = False):
+    if request.headers.get("content-type", "").startswith(MSGPACK_TYPES):
+        return await create_packed_measurement(body)
+
+    try:
+        measurement_data = MeasurementCreate.model_validate_json(body)
+    except ValidationError as e:
+        raise body_validation_error(e)
+    measurement = await build_measurement(measurement_data, now_ms())
+    apply_geometry([measurement])
+    await db.measurements.insert_one(measurement_document(measurement, await reserve_seq()))
+    if measurement.imageId:
+        thumbnailer.schedule(measurement.imageId)
+    if serialize:
+        return Response(content=json.dumps(measurement.dict()).encode(), media_type="application/json")
     return measurement
 
-@api_router.get("/measurements", response_model=List[Measurement])
-async def get_measurements():
-    """Get all measurements"""
-    measurements = await db.measurements.find().sort("timestamp", -1).to_list(1000)
-    return [Measurement(**m) for m in measurements]
+async def create_packed_measurement(body: bytes) -> Response:
+    try:
+        payload = msgpack.unpackb(body)
+        if not isinstance(payload, dict):
+            raise ValueError("expected a map")
+        if "points" in payload:
+            raise ValueError("send points as pointsXY, not points")
+        dtype = payload.pop("pointsDtype", "f8")
+        xy = decode_wire_points(payload.pop("pointsXY", b""), dtype)
+        point_ids = payload.pop("pointIds", None) or default_point_ids(len(xy))
+        if not isinstance(point_ids, list) or not all(isinstance(i, str) for i in point_ids):
+            raise ValueError("pointIds must be a list of strings")
+    except (ValueError, msgpack.UnpackException, TypeError) as e:
+        raise HTTPException(status_code=400, detail=f"Invalid MessagePack measurement: {e}")
+    if len(point_ids) != len(xy):
+        raise HTTPException(status_code=400, detail="pointIds and pointsXY differ in length")
+
+    try:
+        measurement_data = MeasurementCreate.model_validate({**payload, "points": []})
+    except ValidationError as e:
+        raise body_validation_error(e)
+    measurement = await build_measurement(measurement_data, now_ms())
+    result = compute_results(
+        [measurement.mode], [xy], [measurement.calibrationScale],
+        [volume_height(measurement.result.volume, measurement.result.area)],
+    )[0]
+    measurement.result = MeasurementResult(**result)
+
+    await db.measurements.insert_one(measurement_document(measurement, await reserve_seq(), xy, point_ids))
+    if measurement.imageId:
+        thumbnailer.schedule(measurement.imageId)
+    response = {
+        **measurement.dict(exclude={"points"}),
+        # Packed in the dtype of the request
+        "pointsXY": xy.tobytes(),
+        "pointsDtype": dtype,
+        "pointIds": list(point_ids),
+    }
+    return Response(content=msgpack.packb(response), media_type="application/msgpack")
+
+async def read_batch_items(request: Request) -> List[Any]:
+    """Read a JSON array body, or an NDJSON body one line at a time"""
+    too_many = HTTPException(status_code=413, detail=f"At most {MAX_BATCH_ITEMS} measurements per batch")
+    too_big = HTTPException(status_code=413, detail=f"Batch body larger than {MAX_BATCH_BODY_SIZE} bytes")
+    size = 0
+    if request.headers.get("content-type", "").startswith(("application/x-ndjson", "application/ndjson")):
+        items: List[Any] = []
+        buffer = b""
+        async for chunk in request.stream():
+            size += len(chunk)
+            if size > MAX_BATCH_BODY_SIZE:
+                raise too_big
+            buffer += chunk
+            *lines, buffer = buffer.split(b"\n")
+            items.extend(json.loads(line) for line in lines if line.strip())
+            if len(items) > MAX_BATCH_ITEMS:
+                raise too_many
+        if buffer.strip():
+            items.append(json.loads(buffer))
+        if len(items) > MAX_BATCH_ITEMS:
+            raise too_many
+        return items
+
+    chunks = []
+    async for chunk in request.stream():
+        size += len(chunk)
+        if size > MAX_BATCH_BODY_SIZE:
+            raise too_big
+        chunks.append(chunk)
+    items = json.loads(b"".join(chunks))
+    if not isinstance(items, list):
+        raise HTTPException(status_code=400, detail="Expected a JSON array of measurements")
+    if len(items) > MAX_BATCH_ITEMS:
+        raise too_many
+    return items
+
+@api_router.post("/measurements/batch", response_model=BatchResult)
+async def create_measurements_batch(request: Request):
+    """Create many measurements at once, e.g. when an offline device syncs.
+
+    Accepts a JSON array or NDJSON (application/x-ndjson). Invalid items are
+    reported per index and do not stop the rest of the batch.
+    """
+    try:
+        items = await read_batch_items(request)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Malformed JSON in batch body")
+
+    results = [BatchItemResult(index=i) for i in range(len(items))]
+    measurements = []
+    timestamp = now_ms()
+    for i, item in enumerate(items):
+        try:
+            measurement = await build_measurement(MeasurementCreate.model_validate(item), timestamp)
+        except ValidationError as e:
+            results[i].error = "; ".join(f"{'.'.join(map(str, err['loc']))}: {err['msg']}" for err in e.errors())
+            continue
+        except HTTPException as e:
+            results[i].error = e.detail
+            continue
+        results[i].id = measurement.id
+        measurements.append((i, measurement))
+
+    apply_geometry([m for _, m in measurements])
+    first_seq = await reserve_seq(len(measurements)) if measurements else 0
+    documents = [
+        (i, measurement_document(m, first_seq + n))
+        for n, (i, m) in enumerate(measurements)
+    ]
+
+    for start in range(0, len(documents), WRITE_CHUNK_SIZE):
+        chunk = documents[start:start + WRITE_CHUNK_SIZE]
+        try:
+            await db.measurements.insert_many([doc for _, doc in chunk], ordered=False)
+        except BulkWriteError as e:
+            for write_error in e.details.get("writeErrors", []):
+                index = chunk[write_error["index"]][0]
+                results[index].id = None
+                results[index].error = write_error.get("errmsg", "Write failed")
+
+    for image_id in {doc["imageId"] for _, doc in documents if doc["imageId"]}:
+        thumbnailer.schedule(image_id)
+
+    failed = sum(1 for r in results if r.error)
+    return BatchResult(created=len(results) - failed, failed=failed, results=results)
+
+RECOMPUTE_PROJECTION = projection_with_points({"_id": 0, "id": 1, "mode": 1, "points": 1, "calibrationScale": 1, "result": 1})
+
+def recompute_results(docs: List[Dict[str, Any]], calibration_scale: Optional[float]) -> List[Dict[str, Any]]:
+    """Results for stored measurements from their points, optionally with a corrected scale"""
+    if calibration_scale is not None:
+        for doc in docs:
+            doc["calibrationScale"] = calibration_scale
+    return compute_results(
+        [d["mode"] for d in docs],
+        [points_xy(d) for d in docs],
+        [d["calibrationScale"] for d in docs],
+        [volume_height(d["result"].get("volume"), d["result"].get("area")) for d in docs],
+    )
+
+async def store_recomputed(docs: List[Dict[str, Any]], results: List[Dict[str, Any]]):
+    first_seq = await reserve_seq(len(docs)) if docs else 0
+    updates = [
+        UpdateOne({"id": doc["id"]}, {"$set": {
+            "calibrationScale": doc["calibrationScale"],
+            "result": MeasurementResult(**result).dict(),
+            **change_fields(first_seq + n),
+        }})
+        for n, (doc, result) in enumerate(zip(docs, results))
+    ]
+    for start in range(0, len(updates), WRITE_CHUNK_SIZE):
+        await db.measurements.bulk_write(updates[start:start + WRITE_CHUNK_SIZE], ordered=False)
+    for doc in docs:
+        measurement_cache.invalidate(doc["id"])
+
+@api_router.post("/measurements/recompute", response_model=RecomputeResult)
+async def recompute_measurements(request: RecomputeRequest):
+    """Recompute stored results from points, optionally with a corrected scale"""
+    docs = await db.measurements.find({"id": {"$in": request.ids}}, RECOMPUTE_PROJECTION).to_list(None)
+    results = recompute_results(docs, request.calibrationScale)
+    await store_recomputed(docs, results)
+
+    found = {d["id"] for d in docs}
+    return RecomputeResult(
+        updated=len(docs),
+        missing=[i for i in request.ids if i not in found],
+        results=[
+            RecomputeItem(id=d["id"], calibrationScale=d["calibrationScale"], result=MeasurementResult(**r))
+            for d, r in zip(docs, results)
+        ],
+    )
+
+async def recalibrate_batches(query: Dict[str, Any], new_scale: float) -> AsyncIterator[Dict[str, Any]]:
+    """Rescale matching measurements batch by batch, yielding progress after each batch"""
+    matched = await db.measurements.count_documents(query)
+    processed = 0
+    modified = 0
+    yield {"matched": matched, "processed": 0, "modified": 0}
+
+    projection = {"_id": 0, "id": 1, "calibrationScale": 1, "result": 1}
+    cursor = db.measurements.find(query, projection).batch_size(WRITE_CHUNK_SIZE)
+    # (id, old scale, rescaled result) waiting for the next bulk_write
+    pending = []
+
+    async def flush():
+        nonlocal modified
+        first_seq = await reserve_seq(len(pending))
+        # Matching on the old scale keeps a repeated or concurrent run from rescaling twice
+        updates = [
+            UpdateOne({"id": measurement_id, "calibrationScale": old_scale}, {"$set": {
+                "calibrationScale": new_scale,
+                "result": result,
+                **change_fields(first_seq + n),
+            }})
+            for n, (measurement_id, old_scale, result) in enumerate(pending)
+        ]
+        result = await db.measurements.bulk_write(updates, ordered=False)
+        modified += result.modified_count
+        pending.clear()
+        measurement_cache.clear()
+
+    async for doc in cursor:
+        processed += 1
+        old_scale = doc["calibrationScale"]
+        if old_scale == new_scale or old_scale <= 0:
+            continue
+        pending.append((doc["id"], old_scale, rescale_result(doc.get("result") or {}, old_scale, new_scale)))
+        if len(pending) >= WRITE_CHUNK_SIZE:
+            await flush()
+            yield {"matched": matched, "processed": processed, "modified": modified}
+    if pending:
+        await flush()
+    yield {"matched": matched, "processed": processed, "modified": modified, "done": True}
+
+async def recalibrate_progress(query: Dict[str, Any], new_scale: float):
+    async for progress in recalibrate_batches(query, new_scale):
+        yield json.dumps(progress) + "\n"
+
+@api_router.post("/measurements/recalibrate")
+async def recalibrate_measurements(request: RecalibrateRequest):
+    """Rescale the results of every measurement matching a filter to a new calibrationScale.
+
+    Distances and perimeters scale linearly with old/new scale, areas and
+    volumes quadratically. Progress is streamed back as NDJSON lines; for
+    large collections POST /api/jobs/recalibrate runs the same in the background.
+    """
+    query = request.filter.to_query()
+    if not query:
+        raise HTTPException(status_code=400, detail="Recalibration needs at least one filter")
+    return StreamingResponse(
+        recalibrate_progress(query, request.calibrationScale),
+        media_type="application/x-ndjson",
+    )
+
+def range_query(low: Optional[float], high: Optional[float], high_op: str = "$lte") -> Optional[Dict[str, Any]]:
+    condition: Dict[str, Any] = {}
+    if low is not None:
+        condition["$gte"] = low
+    if high is not None:
+        condition[high_op] = high
+    return condition or None
+
+def measurement_filter(
+    mode: Optional[str] = None,
+    unit: Optional[str] = None,
+    project: Optional[str] = None,
+    tag: Optional[str] = None,
+    since: Optional[int] = Query(None, description="Earliest timestamp (ms), inclusive"),
+    until: Optional[int] = Query(None, description="Latest timestamp (ms), exclusive"),
+    namePrefix: Optional[str] = None,
+    q: Optional[str] = Query(None, description="Full text search on the name"),
+    minDistance: Optional[float] = None,
+    maxDistance: Optional[float] = None,
+    minArea: Optional[float] = None,
+    maxArea: Optional[float] = None,
+    minVolume: Optional[float] = None,
+    maxVolume: Optional[float] = None,
+    minPerimeter: Optional[float] = None,
+    maxPerimeter: Optional[float] = None,
+) -> Dict[str, Any]:
+    """Mongo query for the measurement list, count and export filters"""
+    query: Dict[str, Any] = {}
+    if mode:
+        query["mode"] = mode
+    if unit:
+        query["unit"] = unit
+    if project:
+        query["project"] = project
+    if tag:
+        query["tags"] = tag
+    if namePrefix:
+        # Anchored, case sensitive prefix so the name index can be used
+        query["name"] = {"$regex": "^" + re.escape(namePrefix)}
+    if q:
+        query["$text"] = {"$search": q}
+    conditions = {
+        "timestamp": range_query(since, until, "$lt"),
+        "result.distance": range_query(minDistance, maxDistance),
+        "result.area": range_query(minArea, maxArea),
+        "result.volume": range_query(minVolume, maxVolume),
+        "result.perimeter": range_query(minPerimeter, maxPerimeter),
+    }
+    query.update({field: c for field, c in conditions.items() if c})
+    return query
+
+def parse_cursor(cursor: str):
+    """Split a "<timestamp>:<id>" page cursor into its parts"""
+    timestamp, sep, measurement_id = cursor.partition(":")
+    if not sep or not measurement_id:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+    try:
+        return int(timestamp), measurement_id
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid cursor")
+
+def make_cursor(measurement: Dict[str, Any]) -> str:
+    return f"{measurement['timestamp']}:{measurement['id']}"
+
+# Stored on measurement documents but not part of the API representation:
+# legacy inline images and the change sequence, which only /sync exposes
+HIDDEN_FIELDS = {"_id": 0, "imageData": 0, "seq": 0, "changedAt": 0}
+
+def parse_fields(fields: Optional[str]) -> Optional[Dict[str, int]]:
+    """Build a Mongo projection from a comma separated field list"""
+    if not fields:
+        return dict(HIDDEN_FIELDS)
+    requested = {f.strip() for f in fields.split(",") if f.strip()}
+    unknown = requested - set(Measurement.model_fields)
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(sorted(unknown))}")
+    # id and timestamp are always needed to build the page cursors
+    requested |= {"id", "timestamp"}
+    projection = projection_with_points({f: 1 for f in requested})
+    projection["_id"] = 0
+    return projection
+
+@api_router.get("/measurements")
+async def get_measurements(
+    response: Response,
+    limit: int = Query(100, ge=1, le=1000),
+    before: Optional[str] = None,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    query: Dict[str, Any] = Depends(measurement_filter),
+):
+    """Get measurements, newest first, one page at a time.
+
+    Pass the X-Next-Cursor response header as `before` to fetch older
+    measurements, or X-Prev-Cursor as `after` to fetch newer ones. The
+    filters are the same as for /measurements/count and /measurements/export.
+    """
+    if before and after:
+        raise HTTPException(status_code=400, detail="Use either before or after, not both")
+
+    direction = -1
+    if before:
+        timestamp, measurement_id = parse_cursor(before)
+        query["$or"] = [
+            {"timestamp": {"$lt": timestamp}},
+            {"timestamp": timestamp, "id": {"$lt": measurement_id}},
+        ]
+    elif after:
+        timestamp, measurement_id = parse_cursor(after)
+        query["$or"] = [
+            {"timestamp": {"$gt": timestamp}},
+            {"timestamp": timestamp, "id": {"$gt": measurement_id}},
+        ]
+        direction = 1
+
+    cursor = db.measurements.find(query, parse_fields(fields))
+    cursor = cursor.sort([("timestamp", direction), ("id", direction)]).limit(limit)
+    measurements = [expand_points(m) for m in await cursor.to_list(limit)]
+    if direction == 1:
+        measurements.reverse()
+
+    if measurements:
+        response.headers["X-Prev-Cursor"] = make_cursor(measurements[0])
+        if len(measurements) == limit or after:
+            response.headers["X-Next-Cursor"] = make_cursor(measurements[-1])
+    if FAST_JSON:
+        return raw_json_response(measurements, response.headers)
+    return measurements
+
+# Export and count endpoints. These are registered before
+# /measurements/{measurement_id} so that "export" and "count" are not taken
+# for a measurement id.
+EXPORT_BATCH_SIZE = 500
+
+CSV_MEASUREMENT_COLUMNS = [
+    "id", "name", "mode", "unit", "calibrationScale",
+    "distance", "area", "volume", "perimeter", "timestamp", "imageId", "project", "tags",
+]
+CSV_POINT_COLUMNS = ["measurementId", "name", "mode", "index", "pointId", "x", "y"]
+
+def csv_rows(measurement: Dict[str, Any], points: bool) -> List[List[Any]]:
+    if points:
+        return [
+            [measurement["id"], measurement["name"], measurement["mode"], i, p["id"], p["x"], p["y"]]
+            for i, p in enumerate(measurement.get("points", []))
+        ]
+    result = measurement.get("result") or {}
+    return [[
+        measurement["id"], measurement["name"], measurement["mode"], measurement["unit"],
+        measurement["calibrationScale"], result.get("distance"), result.get("area"),
+        result.get("volume"), result.get("perimeter"), measurement["timestamp"],
+        measurement.get("imageId"), measurement.get("project"), ";".join(measurement.get("tags") or []),
+    ]]
+
+async def export_lines(measurements: AsyncIterator[Dict[str, Any]], format: str, points: bool):
+    """Encode measurements as CSV or NDJSON, one chunk per EXPORT_BATCH_SIZE documents"""
+    buffer = io.StringIO()
+    writer = csv.writer(buffer)
+    if format == "csv":
+        writer.writerow(CSV_POINT_COLUMNS if points else CSV_MEASUREMENT_COLUMNS)
+
+    count = 0
+    async for measurement in measurements:
+        expand_points(measurement)
+        if format == "csv":
+            writer.writerows(csv_rows(measurement, points))
+        else:
+            buffer.write(json.dumps(measurement) + "\n")
+        count += 1
+        if count % EXPORT_BATCH_SIZE == 0:
+            yield buffer.getvalue()
+            buffer.seek(0)
+            buffer.truncate()
+    if buffer.tell():
+        yield buffer.getvalue()
+
+def export_media_type(format: str) -> str:
+    return "text/csv" if format == "csv" else "application/x-ndjson"
+
+def export_headers(format: str, filename: str) -> Dict[str, str]:
+    extension = "csv" if format == "csv" else "ndjson"
+    return {"Content-Disposition": f'attachment; filename="{filename}.{extension}"'}
+
+def export_response(lines: AsyncIterator[str], format: str, filename: str) -> StreamingResponse:
+    return StreamingResponse(lines, media_type=export_media_type(format), headers=export_headers(format, filename))
+
+def export_projection(format: str, points: bool) -> Dict[str, int]:
+    projection = dict(HIDDEN_FIELDS)
+    if format == "csv" and not points:
+        projection["points"] = 0
+    return projection_with_points(projection)
+
+@api_router.get("/measurements/export")
+async def export_measurements(
+    format: str = "csv",
+    points: bool = False,
+    query: Dict[str, Any] = Depends(measurement_filter),
+):
+    """Stream many measurements as CSV or NDJSON, newest first.
+
+    Takes the same filters as the measurement list. With points=true the CSV
+    has one row per point instead of one row per measurement.
+    """
+    if format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+
+    cursor = db.measurements.find(query, export_projection(format, points))
+    cursor = cursor.sort(PAGE_SORT).batch_size(EXPORT_BATCH_SIZE)
+    return export_response(export_lines(cursor, format, points), format, "measurements")
+
+@api_router.get("/measurements/count")
+async def count_measurements(query: Dict[str, Any] = Depends(measurement_filter)):
+    """Number of measurements matching the list filters"""
+    if not query:
+        # From the collection metadata instead of a scan
+        return {"count": await db.measurements.estimated_document_count()}
+    return {"count": await db.measurements.count_documents(query)}
+
+async def cached_measurement_response(request: Request, measurement_id: str, variant: str, render) -> Response:
+    """Serve a measurement response from the cache, rendering it on a miss.
+
+    A matching If-None-Match is answered with 304; on a cache hit that
+    happens without touching the database.
+    """
+    body = measurement_cache.get(measurement_id, variant)
+    if body is None:
+        version = measurement_cache.version
+        body = await render()
+        measurement_cache.put(measurement_id, variant, body, version)
+    if body.matches(request.headers.get("if-none-match")):
+        return Response(status_code=304, headers={"ETag": body.etag})
+    return Response(content=body.body, media_type=body.media_type, headers={**body.headers, "ETag": body.etag})
+
+@api_router.get("/measurements/export/{measurement_id}")
+async def export_measurement(request: Request, measurement_id: str, format: str = "json", points: bool = False):
+    """Export a measurement in various formats"""
+    async def render() -> CachedBody:
+        measurement = await db.measurements.find_one({"id": measurement_id}, export_projection(format, points))
+        if not measurement:
+            raise HTTPException(status_code=404, detail="Measurement not found")
+
+        if format in ("csv", "ndjson"):
+            async def single():
+                yield measurement
+            content = "".join([chunk async for chunk in export_lines(single(), format, points)])
+            return CachedBody(
+                content.encode(),
+                export_media_type(format),
+                export_headers(format, f"measurement-{measurement_id}"),
+            )
+        return CachedBody(json.dumps(expand_points(measurement)).encode(), "application/json")
+
+    variant = f"export:{format}:{points}" if format in ("csv", "ndjson") else "export:json"
+    return await cached_measurement_response(request, measurement_id, variant, render)
 
 @api_router.get("/measurements/{measurement_id}", response_model=Measurement)
-async def get_measurement(measurement_id: str):
+async def get_measurement(request: Request, measurement_id: str):
     """Get a specific measurement"""
-    measurement = await db.measurements.find_one({"id": measurement_id})
-    if not measurement:
-        raise HTTPException(status_code=404, detail="Measurement not found")
-    return Measurement(**measurement)
+    async def render() -> CachedBody:
+        measurement = await db.measurements.find_one({"id": measurement_id}, HIDDEN_FIELDS)
+        if not measurement:
+            raise HTTPException(status_code=404, detail="Measurement not found")
+        return CachedBody(json.dumps(Measurement(**expand_points(measurement)).dict()).encode(), "application/json")
+
+    return await cached_measurement_response(request, measurement_id, "get", render)
 
 @api_router.delete("/measurements/{measurement_id}")
 async def delete_measurement(measurement_id: str):
     """Delete a measurement"""
     result = await db.measurements.delete_one({"id": measurement_id})
+    measurement_cache.invalidate(measurement_id)
     if result.deleted_count == 0:
         raise HTTPException(status_code=404, detail="Measurement not found")
+    await db.measurement_tombstones.insert_one({
+        "id": measurement_id,
+        "deletedAt": datetime.utcnow(),
+        **change_fields(await reserve_seq()),
+    })
     return {"message": "Measurement deleted"}
 
-@api_router.get("/measurements/export/{measurement_id}")
-async def export_measurement(measurement_id: str, format: str = "json"):
-    """Export a measurement in various formats"""
-    measurement = await db.measurements.find_one({"id": measurement_id})
+# Project and tag aggregation, computed by Mongo in a single $group
+RESULT_FIELDS = ("distance", "area", "volume", "perimeter")
+
+def group_pipeline(query: Dict[str, Any], key: str, unwind: Optional[str] = None) -> List[Dict[str, Any]]:
+    stages: List[Dict[str, Any]] = [{"$match": query}]
+    if unwind:
+        stages.append({"$unwind": unwind})
+    group: Dict[str, Any] = {
+        "_id": key,
+        "count": {"$sum": 1},
+        "firstTimestamp": {"$min": "$timestamp"},
+        "lastTimestamp": {"$max": "$timestamp"},
+    }
+    for field in RESULT_FIELDS:
+        group[f"{field}Total"] = {"$sum": f"$result.{field}"}
+        group[f"{field}Min"] = {"$min": f"$result.{field}"}
+        group[f"{field}Max"] = {"$max": f"$result.{field}"}
+    stages += [{"$group": group}, {"$sort": {"lastTimestamp": -1}}]
+    return stages
+
+def group_summary(row: Dict[str, Any]) -> GroupSummary:
+    return GroupSummary(
+        key=row["_id"],
+        count=row["count"],
+        firstTimestamp=row["firstTimestamp"],
+        lastTimestamp=row["lastTimestamp"],
+        **{
+            field: ResultStats(total=row[f"{field}Total"], min=row[f"{field}Min"], max=row[f"{field}Max"])
+            for field in RESULT_FIELDS
+        },
+    )
+
+async def aggregate_groups(query: Dict[str, Any], key: str, unwind: Optional[str] = None) -> List[GroupSummary]:
+    rows = await db.measurements.aggregate(group_pipeline(query, key, unwind)).to_list(None)
+    return [group_summary(row) for row in rows]
+
+@api_router.get("/projects", response_model=List[GroupSummary])
+async def get_projects(query: Dict[str, Any] = Depends(measurement_filter)):
+    """Count, summed results and min/max per project, most recently used first"""
+    return await aggregate_groups(query, "$project")
+
+@api_router.get("/projects/{project}", response_model=List[GroupSummary])
+async def get_project(project: str, query: Dict[str, Any] = Depends(measurement_filter)):
+    """Totals of one project, one row per measurement mode"""
+    query["project"] = project
+    groups = await aggregate_groups(query, "$mode")
+    if not groups:
+        raise HTTPException(status_code=404, detail="Project not found")
+    return groups
+
+@api_router.get("/tags", response_model=List[GroupSummary])
+async def get_tags(query: Dict[str, Any] = Depends(measurement_filter)):
+    """Count, summed results and min/max per tag; a measurement counts once per tag"""
+    return await aggregate_groups(query, "$tags", unwind="$tags")
+
+# Image endpoints
+def decode_image_data(image_data: str) -> bytes:
+    """Decode a legacy base64 image, optionally given as a data: URL"""
+    if image_data.startswith("data:"):
+        image_data = image_data.partition(",")[2]
+    return base64.b64decode(image_data, validate=True)
+
+async def store_inline_image(image_data: str) -> Optional[str]:
+    """Store a legacy inline image; None for values that are not base64"""
+    try:
+        raw = decode_image_data(image_data)
+    except (binascii.Error, ValueError):
+        # The app has sent local file URIs here, which point at nothing the
+        # server can fetch; accept the measurement without an image
+        return None
+    if len(raw) > MAX_IMAGE_SIZE:
+        raise HTTPException(status_code=413, detail="Image too large")
+    image_id, _ = await image_store.save_bytes(raw)
+    return image_id
+
+async def store_request_image(request: Request) -> ImageUpload:
+    try:
+        image_id, size = await image_store.save_stream(request.stream(), max_size=MAX_IMAGE_SIZE)
+    except EmptyImageError:
+        raise HTTPException(status_code=400, detail="Empty image")
+    except ValueError:
+        raise HTTPException(status_code=413, detail="Image too large")
+    thumbnailer.schedule(image_id)
+    return ImageUpload(imageId=image_id, size=size)
+
+def image_response(image_id: str) -> FileResponse:
+    if not image_store.exists(image_id):
+        raise HTTPException(status_code=404, detail="Image not found")
+    return FileResponse(
+        image_store.path(image_id),
+        media_type=image_store.media_type(image_id),
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+async def derivative_response(image_id: str, variant: str) -> FileResponse:
+    if variant not in VARIANTS:
+        raise HTTPException(status_code=404, detail="Unknown image variant")
+    if not image_store.exists(image_id):
+        raise HTTPException(status_code=404, detail="Image not found")
+    try:
+        path = await thumbnailer.ensure(image_id, variant)
+    except ImageTooLargeError:
+        raise HTTPException(status_code=413, detail="Stored image has too many pixels for a derivative")
+    except OSError:
+        raise HTTPException(status_code=415, detail="Stored file is not a readable image")
+    return FileResponse(
+        path,
+        media_type=thumbnailer.media_type,
+        headers={"Cache-Control": "public, max-age=31536000, immutable"},
+    )
+
+@api_router.post("/images", response_model=ImageUpload)
+async def upload_image(request: Request):
+    """Upload raw image bytes; reference the returned imageId in a measurement"""
+    return await store_request_image(request)
+
+@api_router.get("/images/{image_id}")
+async def download_image(image_id: str):
+    """Stream a stored image"""
+    return image_response(image_id)
+
+@api_router.get("/images/{image_id}/{variant}")
+async def download_image_variant(image_id: str, variant: str):
+    """Stream a downscaled derivative of a stored image (thumb or preview)"""
+    return await derivative_response(image_id, variant)
+
+@api_router.put("/measurements/{measurement_id}/image", response_model=ImageUpload)
+async def upload_measurement_image(measurement_id: str, request: Request):
+    """Upload raw image bytes and attach them to a measurement"""
+    if not await db.measurements.find_one({"id": measurement_id}, {"_id": 1}):
+        raise HTTPException(status_code=404, detail="Measurement not found")
+    upload = await store_request_image(request)
+    await db.measurements.update_one(
+        {"id": measurement_id},
+        {"$set": {"imageId": upload.imageId, **change_fields(await reserve_seq())}, "$unset": {"imageData": ""}},
+    )
+    measurement_cache.invalidate(measurement_id)
+    return upload
+
+@api_router.get("/measurements/{measurement_id}/image")
+async def download_measurement_image(measurement_id: str):
+    """Stream the image attached to a measurement"""
+    measurement = await db.measurements.find_one({"id": measurement_id}, {"_id": 0, "imageId": 1, "imageData": 1})
     if not measurement:
         raise HTTPException(status_code=404, detail="Measurement not found")
-    
-    # Remove MongoDB's _id field to avoid serialization issues
-    if "_id" in measurement:
-        del measurement["_id"]
-    
-    if format == "json":
-        return measurement
-    elif format == "csv":
-        # Simple CSV export
-        return {
-            "name": measurement["name"],
-            "mode": measurement["mode"],
-            "result": measurement["result"],
-            "timestamp": measurement["timestamp"]
-        }
-    
-    return measurement
+    if measurement.get("imageId"):
+        return image_response(measurement["imageId"])
+    if measurement.get("imageData"):
+        # Document written before the image store existed
+        try:
+            raw = decode_image_data(measurement["imageData"])
+        except (binascii.Error, ValueError):
+            # A device file URI rather than image bytes
+            raise HTTPException(status_code=404, detail="Measurement image is not stored on the server")
+        return Response(content=raw, media_type=guess_media_type(raw[:16]))
+    raise HTTPException(status_code=404, detail="Measurement has no image")
+
+@api_router.get("/measurements/{measurement_id}/image/{variant}")
+async def download_measurement_image_variant(measurement_id: str, variant: str):
+    """Stream a downscaled derivative of a measurement's image (thumb or preview)"""
+    measurement = await db.measurements.find_one({"id": measurement_id}, {"_id": 0, "imageId": 1})
+    if not measurement:
+        raise HTTPException(status_code=404, detail="Measurement not found")
+    if not measurement.get("imageId"):
+        raise HTTPException(status_code=404, detail="Measurement has no image")
+    return await derivative_response(measurement["imageId"], variant)
+
+# Diagnostics
+@api_router.get("/metrics")
+async def get_metrics():
+    """Request and MongoDB command metrics in the Prometheus text format"""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+# Representative shapes of the queries issued by the measurement endpoints
+HOT_QUERIES = {
+    "get_measurement": ({"id": ""}, None),
+    "list_measurements": ({}, PAGE_SORT),
+    "list_measurements_page": ({"$or": [
+        {"timestamp": {"$lt": 0}},
+        {"timestamp": 0, "id": {"$lt": ""}},
+    ]}, PAGE_SORT),
+    "list_measurements_by_mode": ({"mode": "area"}, PAGE_SORT),
+    "list_measurements_by_unit": ({"unit": "metric"}, PAGE_SORT),
+    "list_measurements_by_name_prefix": ({"name": {"$regex": "^a"}}, PAGE_SORT),
+    "list_measurements_by_area": ({"result.area": {"$gte": 0, "$lte": 1}}, PAGE_SORT),
+    "recalibrate_by_scale": ({"calibrationScale": {"$gte": 0, "$lte": 1}}, None),
+}
+
+def plan_stages(plan: Dict[str, Any]) -> List[str]:
+    """Flatten an explain() plan tree into its stage names, outermost first"""
+    stages = [plan.get("stage", "?")]
+    if "inputStage" in plan:
+        stages += plan_stages(plan["inputStage"])
+    for child in plan.get("inputStages", []):
+        stages += plan_stages(child)
+    return stages
+
+@api_router.get("/diagnostics/query-plans")
+async def get_query_plans():
+    """Winning query plan of every hot measurement query, flagging collection scans"""
+    plans = {}
+    for name, (query, sort) in HOT_QUERIES.items():
+        cursor = db.measurements.find(query).limit(100)
+        if sort:
+            cursor = cursor.sort(sort)
+        explain = await cursor.explain()
+        winning_plan = explain["queryPlanner"]["winningPlan"]
+        # Newer servers nest the classic plan under queryPlan
+        stages = plan_stages(winning_plan.get("queryPlan", winning_plan))
+        plans[name] = {"stages": stages, "collscan": "COLLSCAN" in stages}
+    return {"collscan": any(p["collscan"] for p in plans.values()), "queries": plans}
+
+# Delta sync
+def parse_sync_token(token: str):
+    """Split a "<seq>.<issued ms>" sync token"""
+    seq, sep, issued = token.partition(".")
+    try:
+        return int(seq), int(issued)
+    except ValueError:
+        raise HTTPException(status_code=400, detail="Invalid sync token")
+
+@api_router.get("/sync", response_model=SyncResponse)
+async def sync_measurements(token: Optional[str] = None, limit: int = Query(500, ge=1, le=5000)):
+    """Measurements changed and ids deleted since the last sync.
+
+    Without a token, or with one older than the tombstone retention, the
+    whole collection is sent with reset=true. Keep calling with the returned
+    token while hasMore is true. Changes can be delivered more than once, so
+    clients should apply them as upserts.
+    """
+    now = now_ms()
+    since = 0
+    reset = True
+    if token:
+        since, issued = parse_sync_token(token)
+        reset = now - issued > TOMBSTONE_RETENTION_SECONDS * 1000
+        if reset:
+            since = 0
+
+    changed_cursor = db.measurements.find({"seq": {"$gt": since}}, {"_id": 0, "imageData": 0})
+    changed = await changed_cursor.sort("seq", ASCENDING).limit(limit + 1).to_list(limit + 1)
+    deleted = []
+    if not reset:
+        deleted_cursor = db.measurement_tombstones.find({"seq": {"$gt": since}}, {"_id": 0})
+        deleted = await deleted_cursor.sort("seq", ASCENDING).limit(limit + 1).to_list(limit + 1)
+
+    changes = sorted(changed + deleted, key=lambda c: c["seq"])
+    more = len(changes) > limit
+    changes = changes[:limit]
+
+    # Advance the token only over settled changes; anything after the first
+    # unsettled one is sent now and again on the next sync
+    next_seq = since
+    for change in changes:
+        if change["changedAt"] > now - SYNC_SETTLE_MS:
+            break
+        next_seq = change["seq"]
+
+    return SyncResponse(
+        token=f"{next_seq}.{now}",
+        reset=reset,
+        hasMore=more and next_seq > since,
+        changed=[expand_points(c) for c in changes if "deletedAt" not in c],
+        deleted=[c["id"] for c in changes if "deletedAt" in c],
+    )
+
+# Background jobs. Handlers work in batches and hit a checkpoint after each
+# one, which is where cancellation takes effect and where interactive
+# requests get the event loop back.
+async def run_recalibrate_job(job: JobContext) -> Dict[str, Any]:
+    request = RecalibrateRequest(**job.params)
+    async for progress in recalibrate_batches(request.filter.to_query(), request.calibrationScale):
+        await job.progress(done=progress["processed"], total=progress["matched"], modified=progress["modified"])
+        await job.checkpoint()
+    return {"matched": progress["matched"], "processed": progress["processed"], "modified": progress["modified"]}
+
+async def run_recompute_job(job: JobContext) -> Dict[str, Any]:
+    request = RecomputeJobRequest(**job.params)
+    query = request.filter.to_query()
+    total = await db.measurements.count_documents(query)
+    done = 0
+    await job.progress(done=0, total=total)
+
+    async def recompute(batch):
+        nonlocal done
+        # The geometry is numpy work; keep it off the event loop
+        results = await asyncio.to_thread(recompute_results, batch, request.calibrationScale)
+        await store_recomputed(batch, results)
+        done += len(batch)
+        await job.progress(done=done, total=total)
+        await job.checkpoint()
+
+    batch = []
+    async for doc in db.measurements.find(query, RECOMPUTE_PROJECTION).batch_size(WRITE_CHUNK_SIZE):
+        batch.append(doc)
+        if len(batch) >= WRITE_CHUNK_SIZE:
+            await recompute(batch)
+            batch = []
+    if batch:
+        await recompute(batch)
+    return {"updated": done}
+
+async def run_export_job(job: JobContext) -> Dict[str, Any]:
+    request = ExportJobRequest(**job.params)
+    query = request.filter.to_query()
+    total = await db.measurements.count_documents(query)
+    count = 0
+    await job.progress(done=0, total=total)
+
+    async def measurements():
+        nonlocal count
+        cursor = db.measurements.find(query, export_projection(request.format, request.points))
+        async for measurement in cursor.sort(PAGE_SORT).batch_size(EXPORT_BATCH_SIZE):
+            count += 1
+            yield measurement
+
+    extension = "csv" if request.format == "csv" else "ndjson"
+    path = job.output_path(f".{extension}")
+    tmp = job.output_path(".tmp")
+    with open(tmp, "w", newline="") as f:
+        async for chunk in export_lines(measurements(), request.format, request.points):
+            await asyncio.to_thread(f.write, chunk)
+            await job.progress(done=count, total=total)
+            await job.checkpoint()
+    os.replace(tmp, path)
+    return {"count": count, "file": path.name, "size": path.stat().st_size}
+
+async def run_thumbnail_job(job: JobContext) -> Dict[str, Any]:
+    request = ThumbnailJobRequest(**job.params)
+    query = {**request.filter.to_query(), "imageId": {"$ne": None}}
+    image_ids = await db.measurements.distinct("imageId", query)
+    rendered = 0
+    failed = 0
+    for n, image_id in enumerate(image_ids, 1):
+        for variant in VARIANTS:
+            try:
+                await thumbnailer.ensure(image_id, variant)
+                rendered += 1
+            except Exception:
+                # Missing file or not an image Pillow can read
+                failed += 1
+        if n % 10 == 0 or n == len(image_ids):
+            await job.progress(done=n, total=len(image_ids))
+            await job.checkpoint()
+    return {"images": len(image_ids), "rendered": rendered, "failed": failed}
+
+job_queue.register("recalibrate", run_recalibrate_job)
+job_queue.register("recompute", run_recompute_job)
+job_queue.register("export", run_export_job)
+job_queue.register("thumbnails", run_thumbnail_job)
+
+async def submit_job(kind: str, request: BaseModel) -> Job:
+    try:
+        return Job(**await job_queue.submit(kind, request.dict()))
+    except JobQueueFull:
+        raise HTTPException(status_code=503, detail="Too many queued jobs, try again later")
+
+@api_router.post("/jobs/recalibrate", response_model=Job, status_code=202)
+async def create_recalibrate_job(request: RecalibrateRequest):
+    """Run /measurements/recalibrate in the background"""
+    if not request.filter.to_query():
+        raise HTTPException(status_code=400, detail="Recalibration needs at least one filter")
+    return await submit_job("recalibrate", request)
+
+@api_router.post("/jobs/recompute", response_model=Job, status_code=202)
+async def create_recompute_job(request: RecomputeJobRequest):
+    """Recompute the results of every measurement matching a filter from its points"""
+    return await submit_job("recompute", request)
+
+@api_router.post("/jobs/export", response_model=Job, status_code=202)
+async def create_export_job(request: ExportJobRequest):
+    """Write a CSV or NDJSON export to a file, downloadable from /jobs/{job_id}/download"""
+    if request.format not in ("csv", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be csv or ndjson")
+    return await submit_job("export", request)
+
+@api_router.post("/jobs/thumbnails", response_model=Job, status_code=202)
+async def create_thumbnail_job(request: ThumbnailJobRequest):
+    """Render missing image derivatives, e.g. for images uploaded before they existed"""
+    return await submit_job("thumbnails", request)
+
+@api_router.get("/jobs", response_model=List[Job])
+async def get_jobs(
+    status: Optional[str] = None,
+    kind: Optional[str] = None,
+    limit: int = Query(50, ge=1, le=500),
+):
+    """Most recent jobs first"""
+    query = {}
+    if status:
+        query["status"] = status
+    if kind:
+        query["kind"] = kind
+    cursor = db.jobs.find(query, {"_id": 0}).sort("createdAt", DESCENDING).limit(limit)
+    return await cursor.to_list(limit)
+
+async def find_job(job_id: str) -> Dict[str, Any]:
+    job = await job_queue.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job
+
+@api_router.get("/jobs/{job_id}", response_model=Job)
+async def get_job(job_id: str):
+    """Status and progress of a job"""
+    return await find_job(job_id)
+
+@api_router.post("/jobs/{job_id}/cancel", response_model=Job)
+async def cancel_job(job_id: str):
+    """Cancel a job; a running one stops after its current batch"""
+    await find_job(job_id)
+    return await job_queue.cancel(job_id)
+
+@api_router.get("/jobs/{job_id}/download")
+async def download_job_output(job_id: str):
+    """Output file of a finished export job"""
+    job = await find_job(job_id)
+    if job["kind"] != "export":
+        raise HTTPException(status_code=404, detail="Job has no output file")
+    if job["status"] != SUCCEEDED:
+        raise HTTPException(status_code=409, detail=f"Job is {job['status']}")
+    path = job_queue.output_dir / job["result"]["file"]
+    if not path.exists():
+        raise HTTPException(status_code=410, detail="Output file has expired")
+    format = job["params"]["format"]
+    return FileResponse(path, media_type=export_media_type(format), headers=export_headers(format, f"measurements-{job_id}"))
 
 # Include the router in the main app
 app.include_router(api_router)
 
+# gzip/Brotli request and response bodies; inside the metrics so that
+# response sizes are counted as sent
+app.add_middleware(
+    CompressionMiddleware,
+    minimum_size=int(os.environ.get('COMPRESSION_MIN_SIZE', 1024)),
+    max_request_size=int(os.environ.get('MAX_DECOMPRESSED_REQUEST_SIZE', 64 * 1024 * 1024)),
+)
+
+app.add_middleware(MetricsMiddleware, metrics=metrics)
+
 app.add_middleware(
     CORSMiddleware,
     allow_credentials=True,
     allow_origins=["*"],
     allow_methods=["*"],
     allow_headers=["*"],
+    # Browsers only let scripts read these response headers when listed
+    expose_headers=["X-Next-Cursor", "X-Prev-Cursor", "ETag", "Idempotent-Replayed"],
 )
 
 # Configure logging
@@ -160,6 +1533,98 @@ logging.basicConfig(
 )
 logger = logging.getLogger(__name__)
 
-@app.on_event("shutdown")
-async def shutdown_db_client():
+async def ensure_indexes():
+    try:
+        # A text index built with another language conflicts with the new one
+        text_index = (await db.measurements.index_information()).get("name_text")
+        if text_index and text_index.get("default_language", "english") != TEXT_LANGUAGE:
+            await db.measurements.drop_index("name_text")
+        await db.measurements.create_indexes(MEASUREMENT_INDEXES)
+    except Exception:
+        # Keep serving; /api/diagnostics/query-plans shows what is missing
+        logger.exception("Could not create measurement indexes")
+    collections = {
+        **STATUS_INDEXES,
+        "measurement_tombstones": TOMBSTONE_INDEXES,
+        "jobs": JOB_INDEXES,
+        "idempotency_keys": idempotency.indexes(IDEMPOTENCY_TTL_SECONDS),
+    }
+    for collection, indexes in collections.items():
+        try:
+            await db[collection].create_indexes(indexes)
+        except Exception:
+            logger.exception("Could not create %s indexes", collection)
+
+async def backfill_change_seq():
+    """Give measurements written before delta sync existed a change sequence number"""
+    query = {"seq": {"$exists": False}}
+    while True:
+        ids = [d["id"] for d in await db.measurements.find(query, {"_id": 0, "id": 1}).limit(WRITE_CHUNK_SIZE).to_list(WRITE_CHUNK_SIZE)]
+        if not ids:
+            break
+        first_seq = await reserve_seq(len(ids))
+        await db.measurements.bulk_write([
+            UpdateOne({"id": measurement_id, **query}, {"$set": change_fields(first_seq + n)})
+            for n, measurement_id in enumerate(ids)
+        ], ordered=False)
+
+async def backfill_status_aggregates():
+    """Count heartbeats stored before the status aggregates existed, once.
+
+    $max keeps the counts of heartbeats that were already aggregated, so
+    running this again, e.g. from a second worker, does not count twice.
+    """
+    if await db.migrations.find_one({"_id": "status_aggregates"}):
+        return
+    # Grouped by hour in Mongo, then into buckets with the same function
+    # that POST /status uses
+    hour = {"$dateToString": {"format": "%Y-%m-%dT%H:00:00", "date": "$timestamp"}}
+    pipeline = [{"$group": {"_id": {"client_name": "$client_name", "hour": hour}, "count": {"$sum": 1}}}]
+    buckets: Dict[Tuple[str, datetime], int] = {}
+    async for row in db.status_checks.aggregate(pipeline):
+        key = (row["_id"]["client_name"], status_bucket(datetime.fromisoformat(row["_id"]["hour"])))
+        buckets[key] = buckets.get(key, 0) + row["count"]
+    updates = [
+        UpdateOne({"client_name": client_name, "bucket": bucket}, {"$max": {"count": count}}, upsert=True)
+        for (client_name, bucket), count in buckets.items()
+    ]
+    for chunk in range(0, len(updates), WRITE_CHUNK_SIZE):
+        await db.status_buckets.bulk_write(updates[chunk:chunk + WRITE_CHUNK_SIZE], ordered=False)
+
+    pipeline = [{"$group": {
+        "_id": "$client_name",
+        "count": {"$sum": 1},
+        "firstSeen": {"$min": "$timestamp"},
+        "lastSeen": {"$max": "$timestamp"},
+    }}]
+    updates = [
+        UpdateOne(
+            {"client_name": row["_id"]},
+            {"$max": {"count": row["count"], "lastSeen": row["lastSeen"]}, "$min": {"firstSeen": row["firstSeen"]}},
+            upsert=True,
+        )
+        async for row in db.status_checks.aggregate(pipeline)
+    ]
+    for chunk in range(0, len(updates), WRITE_CHUNK_SIZE):
+        await db.status_clients.bulk_write(updates[chunk:chunk + WRITE_CHUNK_SIZE], ordered=False)
+    await db.migrations.update_one(
+        {"_id": "status_aggregates"}, {"$set": {"finishedAt": datetime.now(timezone.utc)}}, upsert=True,
+    )
+
+async def startup():
+    global client, db
+    client = create_client()
+    db = client[os.environ['DB_NAME']]
+    await ensure_indexes()
+    await backfill_change_seq()
+    try:
+        await backfill_status_aggregates()
+    except PyMongoError:
+        # Not marked as done, so the next start tries again
+        logger.exception("Could not backfill the status aggregates")
+    await job_queue.start(db.jobs, stale_after=JOB_STALE_SECONDS, keep_outputs=JOB_RETENTION_SECONDS)
+
+async def shutdown():
+    await job_queue.stop()
     client.close()
+    thumbnailer.shutdown()
@@ -0,0 +1,111 @@
+"""Downscaled and recompressed derivatives of stored images.
+
+Derivatives are rendered on a bounded thread pool (Pillow releases the GIL
+while decoding, resizing and encoding) so the event loop keeps serving
+requests, and are cached next to the original in the image store.
+"""
+import asyncio
+import os
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, NamedTuple
+
+from PIL import Image, ImageOps, features
+
+from image_store import ImageStore
+
+
+class Variant(NamedTuple):
+    max_size: int
+    quality: int
+
+
+VARIANTS = {
+    "thumb": Variant(max_size=256, quality=70),
+    "preview": Variant(max_size=1024, quality=80),
+}
+
+
+def derivative_format() -> str:
+    """WebP where Pillow was built with it, JPEG otherwise"""
+    return "WEBP" if features.check("webp") else "JPEG"
+
+
+MEDIA_TYPES = {"WEBP": "image/webp", "JPEG": "image/jpeg"}
+
+# Decoding allocates about 3 bytes per pixel, whatever the file size
+DEFAULT_MAX_PIXELS = 50_000_000
+
+
+class ImageTooLargeError(ValueError):
+    """The image has more pixels than the thumbnailer decodes"""
+
+
+def render(source: str, target: str, variant: Variant, format: str, max_pixels: int):
+    try:
+        image = Image.open(source)
+    except Image.DecompressionBombError as e:
+        raise ImageTooLargeError(str(e)) from e
+    with image:
+        # Pillow itself only refuses at twice MAX_IMAGE_PIXELS
+        if image.width * image.height > max_pixels:
+            raise ImageTooLargeError(f"{image.width}x{image.height} image exceeds {max_pixels} pixels")
+        # Camera frames usually carry their rotation in EXIF
+        image = ImageOps.exif_transpose(image)
+        image.thumbnail((variant.max_size, variant.max_size))
+        if image.mode not in ("RGB", "L"):
+            image = image.convert("RGB")
+        tmp = f"{target}.{uuid.uuid4().hex}.tmp"
+        image.save(tmp, format=format, quality=variant.quality)
+    os.replace(tmp, target)
+
+
+class Thumbnailer:
+    def __init__(self, store: ImageStore, workers: int = 2, max_pixels: int = DEFAULT_MAX_PIXELS):
+        self.store = store
+        self.max_pixels = max_pixels
+        Image.MAX_IMAGE_PIXELS = max_pixels
+        self.format = derivative_format()
+        self.media_type = MEDIA_TYPES[self.format]
+        self._executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix="thumbnails")
+        # Renders in progress, so concurrent requests share one
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._background = set()
+
+    def path(self, image_id: str, variant: str) -> str:
+        return str(self.store.path(image_id)) + f".{variant}"
+
+    async def ensure(self, image_id: str, variant: str) -> str:
+        """Path of a derivative, rendering it first if it is not cached yet"""
+        target = self.path(image_id, variant)
+        if os.path.exists(target):
+            return target
+        key = f"{image_id}:{variant}"
+        future = self._pending.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = loop.run_in_executor(
+                self._executor, render, str(self.store.path(image_id)), target, VARIANTS[variant], self.format,
+                self.max_pixels)
+            self._pending[key] = future
+            future.add_done_callback(lambda _: self._pending.pop(key, None))
+        # Shielded so one cancelled request does not cancel the shared render
+        await asyncio.shield(future)
+        return target
+
+    def schedule(self, image_id: str):
+        """Render every variant in the background, e.g. right after an upload"""
+        for variant in VARIANTS:
+            task = asyncio.create_task(self._render_quietly(image_id, variant))
+            self._background.add(task)
+            task.add_done_callback(self._background.discard)
+
+    async def _render_quietly(self, image_id: str, variant: str):
+        try:
+            await self.ensure(image_id, variant)
+        except Exception:
+            # Not an image Pillow can read; the endpoint reports it on request
+            pass
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
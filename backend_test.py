@@ -6,12 +6,19 @@ Tests all measurement endpoints with comprehensive scenarios
 
 import requests
 import json
+import msgpack
+import random
+import struct
 import sys
+import time
 from datetime import datetime
 
 # Use the production URL from frontend/.env
 BASE_URL = "https://dimensor.preview.emergentagent.com/api"
 
+# Server side SYNC_SETTLE_MS, in seconds
+SYNC_SETTLE_SECONDS = 5
+
 class ARMessAppTester:
     def __init__(self):
         self.base_url = BASE_URL
@@ -48,6 +55,39 @@ class ARMessAppTester:
         except Exception as e:
             self.log_test("Root Endpoint", False, f"Exception: {str(e)}")
 
+    def test_status_checks(self):
+        """Test POST /api/status with the raw, summary and bucket views of the heartbeats"""
+        client_name = f"backend-test-{datetime.now().timestamp()}"
+        try:
+            first = requests.post(f"{self.base_url}/status", json={"client_name": client_name}).json()
+            time.sleep(0.01)
+            second = requests.post(f"{self.base_url}/status", json={"client_name": client_name}).json()
+
+            raw = requests.get(f"{self.base_url}/status", params={"client_name": client_name}).json()
+            recent = requests.get(f"{self.base_url}/status", params={"client_name": client_name, "since": second["timestamp"]}).json()
+            if [c["id"] for c in raw] == [second["id"], first["id"]] and [c["id"] for c in recent] == [second["id"]]:
+                self.log_test("Status Checks", True, f"2 heartbeats for {client_name}, 1 since the second")
+            else:
+                self.log_test("Status Checks", False, f"All: {raw}, since: {recent}")
+
+            summary = [c for c in requests.get(f"{self.base_url}/status/summary").json() if c["client_name"] == client_name]
+            # Mongo stores milliseconds, the POST response has microseconds
+            last_seen = summary[0]["lastSeen"] if summary else None
+            if (len(summary) == 1 and summary[0]["count"] == 2 and abs(
+                    datetime.fromisoformat(last_seen) - datetime.fromisoformat(second["timestamp"])).total_seconds() < 0.001):
+                self.log_test("Status Summary", True, f"Count 2, last seen {summary[0]['lastSeen']}")
+            else:
+                self.log_test("Status Summary", False, f"Summary rows: {summary}")
+
+            buckets = requests.get(f"{self.base_url}/status/buckets", params={"client_name": client_name}).json()
+            # Two buckets if the heartbeats straddle the full hour
+            if sum(b["count"] for b in buckets) == 2 and all(b["client_name"] == client_name for b in buckets):
+                self.log_test("Status Buckets", True, f"{len(buckets)} bucket(s) holding 2 heartbeats")
+            else:
+                self.log_test("Status Buckets", False, f"Buckets: {buckets}")
+        except Exception as e:
+            self.log_test("Status Checks", False, f"Exception: {str(e)}")
+
     def test_create_measurement_distance(self):
         """Test POST /api/measurements - Create distance measurement"""
         measurement_data = {
@@ -150,13 +190,45 @@ class ARMessAppTester:
             self.log_test("Create Volume Measurement", False, f"Exception: {str(e)}")
         return None
 
+    def test_create_measurement_idempotent(self):
+        """Test POST /api/measurements with Idempotency-Key - a retry returns the first measurement"""
+        measurement_data = {
+            "name": "Flur Länge",
+            "mode": "distance",
+            "points": [
+                {"x": 0, "y": 0, "id": "point1"},
+                {"x": 30, "y": 40, "id": "point2"}
+            ],
+            "calibrationScale": 1.0,
+            "result": {},
+            "unit": "metric"
+        }
+        headers = {"Idempotency-Key": f"backend-test-{datetime.now().timestamp()}"}
+
+        try:
+            first = requests.post(f"{self.base_url}/measurements", json=measurement_data, headers=headers)
+            retry = requests.post(f"{self.base_url}/measurements", json=measurement_data, headers=headers)
+            if first.status_code == 200 and retry.status_code == 200:
+                self.created_measurement_ids.append(first.json()["id"])
+                if first.json()["id"] == retry.json()["id"] and retry.headers.get("Idempotent-Replayed") == "true":
+                    self.log_test("Idempotent Create", True, f"Retry returned measurement ID: {first.json()['id']}")
+                else:
+                    self.created_measurement_ids.append(retry.json()["id"])
+                    self.log_test("Idempotent Create", False, f"Retry created a second measurement: {retry.json()['id']}")
+            else:
+                self.log_test("Idempotent Create", False, f"Status: {first.status_code}/{retry.status_code}, Response: {retry.text}")
+        except Exception as e:
+            self.log_test("Idempotent Create", False, f"Exception: {str(e)}")
+
     def test_get_all_measurements(self):
         """Test GET /api/measurements - Get all measurements"""
         try:
             response = requests.get(f"{self.base_url}/measurements")
             if response.status_code == 200:
                 data = response.json()
-                if isinstance(data, list):
+                if isinstance(data, list) and any("seq" in m or "changedAt" in m for m in data):
+                    self.log_test("Get All Measurements", False, "Internal sync fields in the response")
+                elif isinstance(data, list):
                     self.log_test("Get All Measurements", True, f"Retrieved {len(data)} measurements")
                     return data
                 else:
@@ -167,6 +239,31 @@ class ARMessAppTester:
             self.log_test("Get All Measurements", False, f"Exception: {str(e)}")
         return None
 
+    def test_get_measurements_paginated(self):
+        """Test GET /api/measurements?limit=&fields= - Cursor pagination with projection"""
+        try:
+            response = requests.get(f"{self.base_url}/measurements", params={"limit": 2, "fields": "name,mode,result"})
+            if response.status_code != 200:
+                self.log_test("Paginated Measurements", False, f"Status: {response.status_code}, Response: {response.text}")
+                return
+            first_page = response.json()
+            if len(first_page) > 2 or any("imageData" in m or "points" in m for m in first_page):
+                self.log_test("Paginated Measurements", False, f"Limit or projection not applied: {first_page}")
+                return
+            next_cursor = response.headers.get("X-Next-Cursor")
+            if not next_cursor:
+                self.log_test("Paginated Measurements", True, f"Single page with {len(first_page)} measurements")
+                return
+            response = requests.get(f"{self.base_url}/measurements", params={"limit": 2, "before": next_cursor, "fields": "name"})
+            second_page = response.json()
+            first_ids = {m["id"] for m in first_page}
+            if response.status_code == 200 and not any(m["id"] in first_ids for m in second_page):
+                self.log_test("Paginated Measurements", True, f"Pages of {len(first_page)} and {len(second_page)} measurements")
+            else:
+                self.log_test("Paginated Measurements", False, f"Overlapping or failed second page: {response.text}")
+        except Exception as e:
+            self.log_test("Paginated Measurements", False, f"Exception: {str(e)}")
+
     def test_get_single_measurement(self, measurement_id):
         """Test GET /api/measurements/{id} - Get single measurement"""
         if not measurement_id:
@@ -188,6 +285,27 @@ class ARMessAppTester:
             self.log_test("Get Single Measurement", False, f"Exception: {str(e)}")
         return None
 
+    def test_measurement_image(self, measurement_id):
+        """Test PUT/GET /api/measurements/{id}/image - Raw image upload and download"""
+        if not measurement_id:
+            self.log_test("Measurement Image", False, "No measurement ID provided")
+            return
+
+        image_bytes = b"\x89PNG\r\n\x1a\n" + bytes(range(256)) * 16
+        try:
+            response = requests.put(f"{self.base_url}/measurements/{measurement_id}/image", data=image_bytes)
+            if response.status_code != 200:
+                self.log_test("Measurement Image", False, f"Upload status: {response.status_code}, Response: {response.text}")
+                return
+            image_id = response.json()["imageId"]
+            response = requests.get(f"{self.base_url}/measurements/{measurement_id}/image")
+            if response.status_code == 200 and response.content == image_bytes:
+                self.log_test("Measurement Image", True, f"Round-tripped image {image_id}")
+            else:
+                self.log_test("Measurement Image", False, f"Download status: {response.status_code}, {len(response.content)} bytes")
+        except Exception as e:
+            self.log_test("Measurement Image", False, f"Exception: {str(e)}")
+
     def test_export_json(self, measurement_id):
         """Test GET /api/measurements/export/{id}?format=json - JSON export"""
         if not measurement_id:
@@ -216,11 +334,11 @@ class ARMessAppTester:
         try:
             response = requests.get(f"{self.base_url}/measurements/export/{measurement_id}?format=csv")
             if response.status_code == 200:
-                data = response.json()
-                if "name" in data and "mode" in data and "result" in data:
+                lines = response.text.strip().splitlines()
+                if len(lines) == 2 and lines[0].startswith("id,name,mode") and measurement_id in lines[1]:
                     self.log_test("Export CSV", True, f"Exported measurement as CSV format")
                 else:
-                    self.log_test("Export CSV", False, f"Invalid CSV export structure: {data}")
+                    self.log_test("Export CSV", False, f"Invalid CSV export structure: {response.text}")
             else:
                 self.log_test("Export CSV", False, f"Status: {response.status_code}, Response: {response.text}")
         except Exception as e:
@@ -245,6 +363,423 @@ class ARMessAppTester:
         except Exception as e:
             self.log_test("Delete Measurement", False, f"Exception: {str(e)}")
 
+    def sync(self, token=None, limit=5000):
+        params = {"limit": limit}
+        if token:
+            params["token"] = token
+        response = requests.get(f"{self.base_url}/sync", params=params)
+        response.raise_for_status()
+        return response.json()
+
+    def create_test_measurement(self, name, **fields):
+        """Create a 100 px distance measurement, or whatever `fields` override"""
+        measurement_data = {
+            "name": name,
+            "mode": "distance",
+            "points": [
+                {"x": 0, "y": 0, "id": "point1"},
+                {"x": 60, "y": 80, "id": "point2"}
+            ],
+            "calibrationScale": 1.0,
+            "result": {},
+            "unit": "metric",
+            **fields
+        }
+        response = requests.post(f"{self.base_url}/measurements", json=measurement_data)
+        response.raise_for_status()
+        return response.json()
+
+    def test_sync(self):
+        """Test GET /api/sync - settle window, hasMore paging and deletion tombstones"""
+        try:
+            data = self.sync()
+            while data["hasMore"]:
+                data = self.sync(data["token"])
+            start_token = data["token"]
+
+            # A change inside the settle window is sent but the token does not move past it
+            first_id = self.create_test_measurement("Sync Erste")["id"]
+            data = self.sync(start_token)
+            sent = {m["id"]: m["seq"] for m in data["changed"]}
+            if first_id in sent and int(data["token"].split(".")[0]) < sent[first_id]:
+                self.log_test("Sync Settle Window", True, "Unsettled change sent without advancing the token")
+            else:
+                self.log_test("Sync Settle Window", False, f"Token {start_token} -> {data['token']}, changed: {sent}")
+
+            second_id = self.create_test_measurement("Sync Zweite")["id"]
+            self.created_measurement_ids.append(second_id)
+            time.sleep(SYNC_SETTLE_SECONDS + 1)
+            # Other clients may have written in between; page until both show up
+            pages = [self.sync(start_token, limit=1)]
+            while pages[-1]["hasMore"] and len(pages) < 100:
+                pages.append(self.sync(pages[-1]["token"], limit=1))
+            sent = [m["id"] for page in pages for m in page["changed"]]
+            if (len(pages) >= 2 and first_id in sent and second_id in sent
+                    and sent.index(first_id) < sent.index(second_id) and all(len(page["changed"]) + len(page["deleted"]) == 1 for page in pages)):
+                self.log_test("Sync Paging", True, f"Settled changes delivered in {len(pages)} pages")
+            else:
+                self.log_test("Sync Paging", False, f"Pages: {pages}")
+            end_token = pages[-1]["token"]
+
+            requests.delete(f"{self.base_url}/measurements/{first_id}").raise_for_status()
+            time.sleep(SYNC_SETTLE_SECONDS + 1)
+            data = self.sync(end_token)
+            while data["hasMore"] and first_id not in data["deleted"]:
+                data = self.sync(data["token"])
+            if first_id in data["deleted"] and not data["reset"]:
+                self.log_test("Sync Tombstone", True, f"Deleted measurement ID: {first_id}")
+            else:
+                self.log_test("Sync Tombstone", False, f"Deletion not reported: {data}")
+        except Exception as e:
+            self.log_test("Sync", False, f"Exception: {str(e)}")
+
+    def test_create_measurement_msgpack(self):
+        """Test POST /api/measurements with a MessagePack body - packed points in f4 and f8"""
+        headers = {"Content-Type": "application/msgpack"}
+        measurement_data = {
+            "name": "Packed Länge",
+            "mode": "distance",
+            "calibrationScale": 1.0,
+            "result": {},
+            "unit": "metric",
+            "pointIds": ["point1", "point2"]
+        }
+        for dtype, layout in (("f4", "<4f"), ("f8", "<4d")):
+            try:
+                packed = {**measurement_data, "pointsXY": struct.pack(layout, 0, 0, 60, 80), "pointsDtype": dtype}
+                response = requests.post(f"{self.base_url}/measurements", data=msgpack.packb(packed), headers=headers)
+                if response.status_code != 200:
+                    self.log_test(f"MessagePack Create {dtype}", False, f"Status: {response.status_code}, Response: {response.text}")
+                    continue
+                data = msgpack.unpackb(response.content)
+                self.created_measurement_ids.append(data["id"])
+                stored = requests.get(f"{self.base_url}/measurements/{data['id']}")
+                expected_points = [{"x": 0.0, "y": 0.0, "id": "point1"}, {"x": 60.0, "y": 80.0, "id": "point2"}]
+                if (response.headers.get("Content-Type") == "application/msgpack" and data["pointsDtype"] == dtype
+                        and struct.unpack(layout, data["pointsXY"]) == (0, 0, 60, 80)
+                        and data["pointIds"] == ["point1", "point2"] and data["result"]["distance"] == 100.0
+                        and stored.status_code == 200 and stored.json()["points"] == expected_points):
+                    self.log_test(f"MessagePack Create {dtype}", True, f"Created measurement ID: {data['id']}")
+                else:
+                    self.log_test(f"MessagePack Create {dtype}", False, f"Response: {data}, JSON GET: {stored.status_code} {stored.text}")
+            except Exception as e:
+                self.log_test(f"MessagePack Create {dtype}", False, f"Exception: {str(e)}")
+
+        try:
+            statuses = []
+            for point_ids in ([1, 2], 5):
+                packed = {**measurement_data, "pointsXY": struct.pack("<4d", 0, 0, 60, 80), "pointIds": point_ids}
+                response = requests.post(f"{self.base_url}/measurements", data=msgpack.packb(packed), headers=headers)
+                statuses.append(response.status_code)
+            if statuses == [400, 400]:
+                self.log_test("MessagePack Invalid pointIds", True, "Correctly returned 400")
+            else:
+                self.log_test("MessagePack Invalid pointIds", False, f"Expected [400, 400], got {statuses}")
+        except Exception as e:
+            self.log_test("MessagePack Invalid pointIds", False, f"Exception: {str(e)}")
+
+    def test_measurement_etag(self):
+        """Test GET /api/measurements/{id} with If-None-Match - 304 while unchanged, 404 once deleted"""
+        try:
+            measurement_id = self.create_test_measurement("ETag Länge")["id"]
+            url = f"{self.base_url}/measurements/{measurement_id}"
+            first = requests.get(url)
+            etag = first.headers.get("ETag")
+            if first.status_code != 200 or not etag:
+                self.log_test("Measurement ETag", False, f"Status: {first.status_code}, ETag: {etag}")
+                return
+            cached = requests.get(url, headers={"If-None-Match": etag})
+            if cached.status_code == 304 and not cached.content:
+                self.log_test("Measurement ETag", True, f"If-None-Match {etag} answered with 304")
+            else:
+                self.log_test("Measurement ETag", False, f"Expected 304, got {cached.status_code}")
+
+            requests.delete(url).raise_for_status()
+            gone = requests.get(url, headers={"If-None-Match": etag})
+            if gone.status_code == 404:
+                self.log_test("Measurement ETag After Delete", True, "Correctly returned 404")
+            else:
+                self.log_test("Measurement ETag After Delete", False, f"Expected 404, got {gone.status_code}")
+        except Exception as e:
+            self.log_test("Measurement ETag", False, f"Exception: {str(e)}")
+
+    def test_create_batch(self):
+        """Test POST /api/measurements/batch - JSON array and NDJSON, invalid items reported per index"""
+        valid = {
+            "name": "Batch Länge",
+            "mode": "distance",
+            "points": [
+                {"x": 0, "y": 0, "id": "point1"},
+                {"x": 60, "y": 80, "id": "point2"}
+            ],
+            "calibrationScale": 2.0,
+            "result": {},
+            "unit": "metric"
+        }
+        invalid = {"name": "Batch Kaputt", "mode": "distance"}
+        try:
+            response = requests.post(f"{self.base_url}/measurements/batch", json=[valid, invalid, valid])
+            data = response.json()
+            if response.status_code == 200:
+                self.created_measurement_ids += [r["id"] for r in data["results"] if r["id"]]
+            results = data.get("results", [])
+            if (response.status_code == 200 and data["created"] == 2 and data["failed"] == 1
+                    and [r["index"] for r in results] == [0, 1, 2]
+                    and results[1]["error"] and not results[1]["id"] and results[0]["id"] and results[2]["id"]):
+                stored = requests.get(f"{self.base_url}/measurements/{results[0]['id']}").json()
+                if stored["result"]["distance"] == 50.0:
+                    self.log_test("Batch Create", True, "2 created, invalid item reported at index 1")
+                else:
+                    self.log_test("Batch Create", False, f"Result not computed: {stored['result']}")
+            else:
+                self.log_test("Batch Create", False, f"Status: {response.status_code}, Response: {data}")
+        except Exception as e:
+            self.log_test("Batch Create", False, f"Exception: {str(e)}")
+
+        try:
+            body = "\n".join(json.dumps(item) for item in [valid, valid]) + "\n"
+            response = requests.post(f"{self.base_url}/measurements/batch", data=body.encode(),
+                                     headers={"Content-Type": "application/x-ndjson"})
+            data = response.json()
+            if response.status_code == 200:
+                self.created_measurement_ids += [r["id"] for r in data["results"] if r["id"]]
+            if response.status_code == 200 and data["created"] == 2 and data["failed"] == 0:
+                self.log_test("Batch Create NDJSON", True, "2 created from NDJSON lines")
+            else:
+                self.log_test("Batch Create NDJSON", False, f"Status: {response.status_code}, Response: {data}")
+        except Exception as e:
+            self.log_test("Batch Create NDJSON", False, f"Exception: {str(e)}")
+
+        try:
+            response = requests.post(f"{self.base_url}/measurements/batch", json=valid)
+            if response.status_code == 400:
+                self.log_test("Batch Create Not An Array", True, "Correctly returned 400")
+            else:
+                self.log_test("Batch Create Not An Array", False, f"Expected 400, got {response.status_code}")
+        except Exception as e:
+            self.log_test("Batch Create Not An Array", False, f"Exception: {str(e)}")
+
+    def test_measurement_filters(self):
+        """Test GET /api/measurements and /api/measurements/count filters"""
+        project = f"Backend Filter {datetime.now().timestamp()}"
+        try:
+            kitchen = self.create_test_measurement("Filter Küche Länge", project=project)
+            time.sleep(0.01)
+            bathroom = self.create_test_measurement("Filter Bad Fläche", project=project, mode="area", unit="imperial", points=[
+                {"x": 0, "y": 0, "id": "corner1"},
+                {"x": 100, "y": 0, "id": "corner2"},
+                {"x": 100, "y": 100, "id": "corner3"},
+                {"x": 0, "y": 100, "id": "corner4"}
+            ])
+            time.sleep(0.01)
+            hallway = self.create_test_measurement("Filter Flur", project=project, calibrationScale=2.0)
+            self.created_measurement_ids += [kitchen["id"], bathroom["id"], hallway["id"]]
+            names = {kitchen["id"]: "kitchen", bathroom["id"]: "bathroom", hallway["id"]: "hallway"}
+
+            cases = [
+                ({"mode": "distance"}, {"kitchen", "hallway"}),
+                ({"unit": "imperial"}, {"bathroom"}),
+                ({"minDistance": 60}, {"kitchen"}),
+                ({"maxDistance": 60}, {"hallway"}),
+                ({"minArea": 5000, "maxArea": 20000}, {"bathroom"}),
+                ({"minPerimeter": 300}, {"bathroom"}),
+                ({"since": bathroom["timestamp"]}, {"bathroom", "hallway"}),
+                ({"until": bathroom["timestamp"]}, {"kitchen"}),
+                ({"namePrefix": "Filter Bad"}, {"bathroom"}),
+            ]
+            failures = []
+            for params, expected in cases:
+                response = requests.get(f"{self.base_url}/measurements", params={"project": project, **params})
+                found = {names.get(m["id"], m["id"]) for m in response.json()} if response.status_code == 200 else response.text
+                if found != expected:
+                    failures.append(f"{params}: {found}")
+            if not failures:
+                self.log_test("Measurement Filters", True, f"{len(cases)} filter combinations matched")
+            else:
+                self.log_test("Measurement Filters", False, "; ".join(failures))
+
+            response = requests.get(f"{self.base_url}/measurements", params={"project": project, "q": "Küche"})
+            found = [m["id"] for m in response.json()] if response.status_code == 200 else response.text
+            if found == [kitchen["id"]]:
+                self.log_test("Measurement Text Search", True, "German name found by q=Küche")
+            else:
+                self.log_test("Measurement Text Search", False, f"Status: {response.status_code}, Found: {found}")
+
+            scoped = requests.get(f"{self.base_url}/measurements/count", params={"project": project}).json()
+            by_mode = requests.get(f"{self.base_url}/measurements/count", params={"project": project, "mode": "distance"}).json()
+            total = requests.get(f"{self.base_url}/measurements/count").json()
+            if scoped["count"] == 3 and by_mode["count"] == 2 and total["count"] >= 3:
+                self.log_test("Measurement Count", True, f"{scoped['count']} in project, {total['count']} in total")
+            else:
+                self.log_test("Measurement Count", False, f"Counts: {scoped}, {by_mode}, {total}")
+        except Exception as e:
+            self.log_test("Measurement Filters", False, f"Exception: {str(e)}")
+
+    def test_projects_and_tags(self):
+        """Test GET /api/projects, /api/projects/{project} and /api/tags - per group counts and totals"""
+        project = f"Backend Test {datetime.now().timestamp()}"
+        try:
+            created = [
+                self.create_test_measurement("Projekt Lang", project=project, tags=["wand", "innen"]),
+                self.create_test_measurement("Projekt Kurz", project=project, tags=["wand"], calibrationScale=2.0),
+                self.create_test_measurement("Projekt Fläche", project=project, mode="area", points=[
+                    {"x": 0, "y": 0, "id": "corner1"},
+                    {"x": 100, "y": 0, "id": "corner2"},
+                    {"x": 100, "y": 100, "id": "corner3"},
+                    {"x": 0, "y": 100, "id": "corner4"}
+                ]),
+            ]
+            self.created_measurement_ids += [m["id"] for m in created]
+
+            response = requests.get(f"{self.base_url}/projects", params={"project": project})
+            rows = response.json()
+            if (response.status_code == 200 and len(rows) == 1 and rows[0]["key"] == project and rows[0]["count"] == 3
+                    and rows[0]["distance"] == {"total": 150.0, "min": 50.0, "max": 100.0}
+                    and rows[0]["area"]["total"] == 10000.0):
+                self.log_test("Projects", True, f"3 measurements in {project}")
+            else:
+                self.log_test("Projects", False, f"Status: {response.status_code}, Response: {rows}")
+
+            response = requests.get(f"{self.base_url}/projects/{project}")
+            counts = {row["key"]: row["count"] for row in response.json()} if response.status_code == 200 else {}
+            if counts == {"distance": 2, "area": 1}:
+                self.log_test("Project By Mode", True, f"Counts per mode: {counts}")
+            else:
+                self.log_test("Project By Mode", False, f"Status: {response.status_code}, Response: {response.text}")
+
+            response = requests.get(f"{self.base_url}/projects/{project} fehlt")
+            if response.status_code == 404:
+                self.log_test("Project Not Found", True, "Correctly returned 404")
+            else:
+                self.log_test("Project Not Found", False, f"Expected 404, got {response.status_code}")
+
+            response = requests.get(f"{self.base_url}/tags", params={"project": project})
+            counts = {row["key"]: row["count"] for row in response.json()} if response.status_code == 200 else {}
+            if counts == {"wand": 2, "innen": 1}:
+                self.log_test("Tags", True, f"Counts per tag: {counts}")
+            else:
+                self.log_test("Tags", False, f"Status: {response.status_code}, Response: {response.text}")
+        except Exception as e:
+            self.log_test("Projects", False, f"Exception: {str(e)}")
+
+    def wait_for_job(self, job_id, timeout=60):
+        """Poll GET /api/jobs/{id} until the job has finished"""
+        deadline = time.monotonic() + timeout
+        while True:
+            job = requests.get(f"{self.base_url}/jobs/{job_id}").json()
+            if job["status"] in ("succeeded", "failed", "cancelled") or time.monotonic() > deadline:
+                return job
+            time.sleep(0.5)
+
+    def test_jobs(self):
+        """Test /api/jobs - export job with download, recompute job, cancellation and errors"""
+        project = f"Backend Job {datetime.now().timestamp()}"
+        job_filter = {"filter": {"project": project}}
+        try:
+            for name in ("Job Eins", "Job Zwei"):
+                self.created_measurement_ids.append(self.create_test_measurement(name, project=project)["id"])
+
+            response = requests.post(f"{self.base_url}/jobs/export", json={**job_filter, "format": "csv"})
+            if response.status_code != 202:
+                self.log_test("Export Job", False, f"Status: {response.status_code}, Response: {response.text}")
+            else:
+                job = self.wait_for_job(response.json()["id"])
+                download = requests.get(f"{self.base_url}/jobs/{job['id']}/download")
+                rows = download.text.strip().splitlines()
+                if job["status"] == "succeeded" and job["result"]["count"] == 2 and download.status_code == 200 and len(rows) == 3:
+                    self.log_test("Export Job", True, f"Exported {job['result']['count']} measurements to {job['result']['file']}")
+                else:
+                    self.log_test("Export Job", False, f"Job: {job}, download status: {download.status_code}")
+
+            response = requests.post(f"{self.base_url}/jobs/recompute", json=job_filter)
+            job = self.wait_for_job(response.json()["id"]) if response.status_code == 202 else {}
+            listed = requests.get(f"{self.base_url}/jobs", params={"kind": "recompute"}).json()
+            if job.get("status") == "succeeded" and job["id"] in [j["id"] for j in listed]:
+                self.log_test("Recompute Job", True, f"Progress: {job['progress']}")
+            else:
+                self.log_test("Recompute Job", False, f"Status: {response.status_code}, Job: {job}")
+
+            response = requests.get(f"{self.base_url}/jobs/{job['id']}/download")
+            if response.status_code == 404:
+                self.log_test("Job Download Without Output", True, "Correctly returned 404")
+            else:
+                self.log_test("Job Download Without Output", False, f"Expected 404, got {response.status_code}")
+
+            # Depending on how quickly a worker picks it up the job is cancelled
+            # while queued, stops at its next checkpoint or has already finished
+            response = requests.post(f"{self.base_url}/jobs/recompute", json=job_filter)
+            cancelled = requests.post(f"{self.base_url}/jobs/{response.json()['id']}/cancel")
+            job = self.wait_for_job(response.json()["id"])
+            if cancelled.status_code == 200 and (job["status"] == "succeeded"
+                                                 or (job["status"] == "cancelled" and job["cancelRequested"])):
+                self.log_test("Cancel Job", True, f"Job ended as {job['status']}")
+            else:
+                self.log_test("Cancel Job", False, f"Cancel status: {cancelled.status_code}, Job: {job}")
+        except Exception as e:
+            self.log_test("Jobs", False, f"Exception: {str(e)}")
+
+        try:
+            unknown = requests.get(f"{self.base_url}/jobs/non-existent-id")
+            unfiltered = requests.post(f"{self.base_url}/jobs/recalibrate", json={"filter": {}, "calibrationScale": 2.0})
+            bad_format = requests.post(f"{self.base_url}/jobs/export", json={"format": "xml"})
+            statuses = (unknown.status_code, unfiltered.status_code, bad_format.status_code)
+            if statuses == (404, 400, 400):
+                self.log_test("Job Errors", True, "Unknown job 404, missing filter and bad format 400")
+            else:
+                self.log_test("Job Errors", False, f"Expected (404, 400, 400), got {statuses}")
+        except Exception as e:
+            self.log_test("Job Errors", False, f"Exception: {str(e)}")
+
+    def recalibrate(self, measurement_filter, scale):
+        """POST /api/measurements/recalibrate and return its last progress line"""
+        response = requests.post(f"{self.base_url}/measurements/recalibrate",
+                                 json={"filter": measurement_filter, "calibrationScale": scale})
+        response.raise_for_status()
+        return json.loads(response.text.strip().splitlines()[-1])
+
+    def test_recalibrate(self):
+        """Test POST /api/measurements/recalibrate - linear and quadratic rescaling, no double rescaling"""
+        # A scale no other measurement has, so the filter only matches ours
+        old_scale = round(random.uniform(1.1, 1.9), 9)
+        new_scale = old_scale * 2
+        try:
+            distance = self.create_test_measurement("Recalibrate Distanz", calibrationScale=old_scale)
+            area = self.create_test_measurement("Recalibrate Fläche", mode="area", calibrationScale=old_scale, points=[
+                {"x": 0, "y": 0, "id": "corner1"},
+                {"x": 100, "y": 0, "id": "corner2"},
+                {"x": 100, "y": 100, "id": "corner3"},
+                {"x": 0, "y": 100, "id": "corner4"}
+            ])
+            self.created_measurement_ids += [distance["id"], area["id"]]
+
+            progress = self.recalibrate({"minScale": old_scale, "maxScale": old_scale}, new_scale)
+            new_distance = requests.get(f"{self.base_url}/measurements/{distance['id']}").json()
+            new_area = requests.get(f"{self.base_url}/measurements/{area['id']}").json()
+            linear = new_distance["result"]["distance"] / distance["result"]["distance"]
+            quadratic = new_area["result"]["area"] / area["result"]["area"]
+            perimeter = new_area["result"]["perimeter"] / area["result"]["perimeter"]
+            if (progress.get("done") and progress["modified"] == 2 and new_distance["calibrationScale"] == new_scale
+                    and abs(linear - 0.5) < 1e-9 and abs(perimeter - 0.5) < 1e-9 and abs(quadratic - 0.25) < 1e-9):
+                self.log_test("Recalibrate", True, f"Distance x{linear:.2f}, area x{quadratic:.2f}")
+            else:
+                self.log_test("Recalibrate", False, f"Progress: {progress}, distance x{linear}, area x{quadratic}")
+
+            # Running the same recalibration again must not rescale a second time
+            progress = self.recalibrate({"minScale": new_scale, "maxScale": new_scale}, new_scale)
+            again = requests.get(f"{self.base_url}/measurements/{distance['id']}").json()
+            if progress["modified"] == 0 and again["result"]["distance"] == new_distance["result"]["distance"]:
+                self.log_test("Recalibrate Repeated", True, "Already recalibrated measurements left alone")
+            else:
+                self.log_test("Recalibrate Repeated", False, f"Progress: {progress}, result: {again['result']}")
+
+            response = requests.post(f"{self.base_url}/measurements/recalibrate", json={"filter": {}, "calibrationScale": 2.0})
+            if response.status_code == 400:
+                self.log_test("Recalibrate Without Filter", True, "Correctly returned 400")
+            else:
+                self.log_test("Recalibrate Without Filter", False, f"Expected 400, got {response.status_code}")
+        except Exception as e:
+            self.log_test("Recalibrate", False, f"Exception: {str(e)}")
+
     def test_error_handling(self):
         """Test error handling with invalid requests"""
         # Test getting non-existent measurement
@@ -288,24 +823,37 @@ class ARMessAppTester:
 
         # Test root endpoint
         self.test_root_endpoint()
+        self.test_status_checks()
 
         # Create measurements
         distance_id = self.test_create_measurement_distance()
         area_id = self.test_create_measurement_area()
         volume_id = self.test_create_measurement_volume()
+        self.test_create_measurement_idempotent()
+        self.test_create_measurement_msgpack()
+        self.test_measurement_etag()
+        self.test_create_batch()
 
         # Test getting all measurements
         self.test_get_all_measurements()
+        self.test_get_measurements_paginated()
 
         # Test getting single measurements
         if distance_id:
             self.test_get_single_measurement(distance_id)
             self.test_export_json(distance_id)
             self.test_export_csv(distance_id)
+            self.test_measurement_image(distance_id)
 
         if area_id:
             self.test_get_single_measurement(area_id)
 
+        self.test_sync()
+        self.test_recalibrate()
+        self.test_measurement_filters()
+        self.test_projects_and_tags()
+        self.test_jobs()
+
         # Test error handling
         self.test_error_handling()
 
@@ -0,0 +1,106 @@
+#!/usr/bin/env python3
+"""
+Serialization benchmark for the list endpoints.
+
+Compares the default FastAPI path with the FAST_JSON path (orjson straight
+from the projected Mongo documents). The default path is what each endpoint
+returns without FAST_JSON: /measurements hands back the projected dicts
+(jsonable_encoder, then stdlib json), /status builds a pydantic model per
+document that is validated against its response_model. Runs offline, no
+database needed:
+
+    python benchmarks/bench_json.py --items 1000 --rounds 50
+"""
+
+import argparse
+import os
+import random
+import sys
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+from typing import List, Optional
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("DB_NAME", "benchmark")
+
+from fastapi.responses import JSONResponse
+from fastapi.routing import serialize_response
+from fastapi.utils import create_response_field
+
+import server
+
+
+def make_measurement(points: int) -> dict:
+    return {
+        "id": str(uuid.uuid4()),
+        "name": f"Messung {random.randint(1, 9999)}",
+        "mode": random.choice(["distance", "area", "volume"]),
+        "points": [
+            {"x": random.uniform(0, 1080), "y": random.uniform(0, 1920), "id": str(i)}
+            for i in range(points)
+        ],
+        "calibrationScale": random.uniform(1, 5),
+        "result": {"distance": None, "area": random.uniform(1, 1e6), "volume": None, "perimeter": random.uniform(1, 1e4)},
+        "unit": "metric",
+        "timestamp": int(time.time() * 1000),
+        "imageId": None,
+    }
+
+
+def make_status_check() -> dict:
+    return {"id": str(uuid.uuid4()), "client_name": f"device-{random.randint(1, 50)}", "timestamp": datetime.utcnow()}
+
+
+async def default_path(docs: List[dict], model: Optional[type]) -> bytes:
+    if model is None:
+        # `return docs` from an endpoint without response_model
+        content = await serialize_response(response_content=docs)
+    else:
+        # `return [Model(**d) for d in docs]` with response_model=List[Model]
+        field = create_response_field(name="response", type_=List[model])
+        content = await serialize_response(field=field, response_content=[model(**d) for d in docs])
+    return JSONResponse(content).body
+
+
+def fast_path(docs: List[dict]) -> bytes:
+    return server.raw_json_response(docs).body
+
+
+async def bench(name: str, docs: List[dict], model: Optional[type], rounds: int):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        slow_body = await default_path(docs, model)
+    slow = (time.perf_counter() - start) / rounds
+
+    start = time.perf_counter()
+    for _ in range(rounds):
+        fast_body = fast_path(docs)
+    fast = (time.perf_counter() - start) / rounds
+
+    print(f"{name:<14} default {slow * 1000:8.2f} ms   fast {fast * 1000:8.2f} ms   "
+          f"speedup {slow / fast:5.1f}x   body {len(slow_body) / 1024:.0f} KiB / {len(fast_body) / 1024:.0f} KiB")
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--items", type=int, default=1000, help="documents per response")
+    parser.add_argument("--points", type=int, default=8, help="points per measurement")
+    parser.add_argument("--rounds", type=int, default=20)
+    args = parser.parse_args()
+
+    random.seed(0)
+    measurements = [make_measurement(args.points) for _ in range(args.items)]
+    status_checks = [make_status_check() for _ in range(args.items)]
+
+    print(f"{args.items} documents per response, {args.rounds} rounds")
+    await bench("measurements", measurements, None, args.rounds)
+    await bench("status_checks", status_checks, server.StatusCheck, args.rounds)
+
+
+if __name__ == "__main__":
+    import asyncio
+    asyncio.run(main())
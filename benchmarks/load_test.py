@@ -0,0 +1,205 @@
+#!/usr/bin/env python3
+"""
+Offline load test for the measurement API.
+
+Runs the FastAPI app in-process (httpx ASGI transport, no network) against
+either a local MongoDB (MONGO_URL) or an in-memory mongomock-motor stand-in,
+seeds measurements and drives concurrent load on create, list, get, export
+and delete. Prints p50/p95/p99 latency and throughput per endpoint:
+
+    python benchmarks/load_test.py --mongomock --seed 2000 --requests 500 --concurrency 20
+
+With --job, a background job over all seeded measurements is started right
+before the load, to compare interactive latencies with and without it:
+
+    python benchmarks/load_test.py --mongomock --seed 20000 --job recompute
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/load_test.py --seed 10000
+
+The measurements collection of the benchmark database (--db, ar_mess_benchmark
+by default, never DB_NAME) is emptied before seeding.
+
+Client and server share one event loop, so numbers are best compared
+against each other (before/after a change) rather than read as absolutes.
+"""
+
+import argparse
+import asyncio
+import base64
+import json
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List
+
+BACKEND_DIR = Path(__file__).resolve().parent.parent / "backend"
+sys.path.insert(0, str(BACKEND_DIR))
+os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+os.environ.setdefault("IMAGE_STORE_DIR", tempfile.mkdtemp(prefix="ar-mess-images-"))
+
+import httpx
+
+import server
+
+
+def make_payload(points: int, image: bytes) -> dict:
+    payload = {
+        "name": f"Messung {random.randint(1, 99999)}",
+        "mode": random.choice(["distance", "area", "volume"]),
+        "points": [
+            {"x": random.uniform(0, 1080), "y": random.uniform(0, 1920), "id": f"p{i}"}
+            for i in range(points)
+        ],
+        "calibrationScale": random.uniform(1, 5),
+        "result": {"area": 1000.0, "volume": 10000.0},
+        "unit": "metric",
+    }
+    if image:
+        payload["imageData"] = base64.b64encode(image).decode()
+    return payload
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+async def drive(name: str, total: int, concurrency: int, call: Callable[[int], Awaitable[httpx.Response]]) -> Dict:
+    """Run `total` calls with `concurrency` workers and summarize their latencies"""
+    latencies: List[float] = []
+    errors = 0
+    next_index = 0
+
+    async def worker():
+        nonlocal next_index, errors
+        while next_index < total:
+            i = next_index
+            next_index += 1
+            start = time.perf_counter()
+            response = await call(i)
+            latencies.append(time.perf_counter() - start)
+            if response.status_code >= 400:
+                errors += 1
+
+    start = time.perf_counter()
+    await asyncio.gather(*(worker() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - start
+
+    latencies.sort()
+    return {
+        "endpoint": name,
+        "requests": total,
+        "errors": errors,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p95_ms": percentile(latencies, 0.95) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+        "rps": total / elapsed if elapsed else 0.0,
+    }
+
+
+async def seed(http: httpx.AsyncClient, count: int, points: int, image: bytes) -> List[str]:
+    ids: List[str] = []
+    for start in range(0, count, 500):
+        batch = [make_payload(points, image) for _ in range(min(500, count - start))]
+        response = await http.post("/api/measurements/batch", json=batch)
+        response.raise_for_status()
+        ids += [r["id"] for r in response.json()["results"] if r["id"]]
+    return ids
+
+
+async def run(args) -> List[Dict]:
+    if args.mongomock:
+        from mongomock_motor import AsyncMongoMockClient
+        server.create_client = AsyncMongoMockClient
+
+    # Set before the lifespan opens the database
+    os.environ["DB_NAME"] = args.db
+
+    random.seed(args.random_seed)
+    image = os.urandom(args.image_kb * 1024) if args.image_kb else b""
+    results = []
+
+    async with server.app.router.lifespan_context(server.app):
+        await server.db.measurements.delete_many({})
+        transport = httpx.ASGITransport(app=server.app)
+        async with httpx.AsyncClient(transport=transport, base_url="http://benchmark") as http:
+            seeded = await seed(http, args.seed, args.points, image)
+            print(f"Seeded {len(seeded)} measurements ({args.points} points, {args.image_kb} KiB image each)")
+
+            job = None
+            if args.job:
+                response = await http.post(f"/api/jobs/{args.job}", json={})
+                response.raise_for_status()
+                job = response.json()
+
+            created: List[str] = []
+
+            async def create(i):
+                response = await http.post("/api/measurements", json=make_payload(args.points, image))
+                if response.status_code == 200:
+                    created.append(response.json()["id"])
+                return response
+
+            async def list_page(i):
+                return await http.get("/api/measurements", params={"limit": args.page_size, "fields": "name,mode,result"})
+
+            async def get(i):
+                return await http.get(f"/api/measurements/{random.choice(seeded)}")
+
+            async def export(i):
+                return await http.get(f"/api/measurements/export/{random.choice(seeded)}", params={"format": "csv"})
+
+            async def delete(i):
+                return await http.delete(f"/api/measurements/{created[i]}")
+
+            scenarios = {"create": create, "list": list_page, "get": get, "export": export}
+            for name in args.endpoints:
+                if name == "delete":
+                    continue
+                results.append(await drive(name, args.requests, args.concurrency, scenarios[name]))
+            if "delete" in args.endpoints and created:
+                results.append(await drive("delete", len(created), args.concurrency, delete))
+            if job:
+                job = (await http.get(f"/api/jobs/{job['id']}")).json()
+                print(f"Background {args.job} job: {job['status']}, progress {job['progress']}")
+    return results
+
+
+def print_table(results: List[Dict]):
+    print(f"{'endpoint':<10}{'requests':>10}{'errors':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'req/s':>10}")
+    for r in results:
+        print(f"{r['endpoint']:<10}{r['requests']:>10}{r['errors']:>8}"
+              f"{r['p50_ms']:>10.2f}{r['p95_ms']:>10.2f}{r['p99_ms']:>10.2f}{r['rps']:>10.0f}")
+
+
+def main():
+    endpoints = ["create", "list", "get", "export", "delete"]
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--mongomock", action="store_true", help="use in-memory mongomock-motor instead of MONGO_URL")
+    parser.add_argument("--db", default="ar_mess_benchmark", help="database to use; its measurements are deleted first")
+    parser.add_argument("--seed", type=int, default=1000, help="measurements to seed before the load")
+    parser.add_argument("--points", type=int, default=8, help="points per measurement")
+    parser.add_argument("--image-kb", type=int, default=0, help="inline image size per created measurement")
+    parser.add_argument("--requests", type=int, default=500, help="requests per endpoint")
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--page-size", type=int, default=100, help="limit for list requests")
+    parser.add_argument("--endpoints", nargs="+", choices=endpoints, default=endpoints)
+    parser.add_argument("--job", choices=["recompute", "export"], help="run this background job during the load")
+    parser.add_argument("--random-seed", type=int, default=0)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    logging.getLogger("httpx").setLevel(logging.WARNING)
+    results = asyncio.run(run(args))
+    print_table(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+#!/usr/bin/env python3
+"""
+Throughput of the measurement API by number of uvicorn worker processes.
+
+For each worker count, starts `uvicorn server:app --workers N` (every worker
+opens its own MongoDB connection pool in the app lifespan), drives it over
+HTTP from several client processes for a fixed time with a mix of list and
+create requests, and prints requests per second and p50/p99 latency:
+
+    MONGO_URL=mongodb://localhost:27017 python benchmarks/scale_test.py --workers 1 2 4
+    python benchmarks/scale_test.py --mongomock --workers 1 2 4 --clients 4
+
+The machine needs more cores than the largest worker count plus the client
+processes, otherwise workers and load generator compete for the same CPUs
+and the numbers flatten out. With --mongomock every worker has its own
+in-memory database; that still measures how request handling scales across
+cores, but leaves MongoDB itself out.
+"""
+
+import argparse
+import asyncio
+import json
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List
+
+BENCHMARKS_DIR = Path(__file__).resolve().parent
+BACKEND_DIR = BENCHMARKS_DIR.parent / "backend"
+
+import httpx
+
+
+def mongomock_app():
+    """uvicorn --factory entry point: the API on an in-memory database"""
+    from mongomock_motor import AsyncMongoMockClient
+
+    import server
+    server.create_client = AsyncMongoMockClient
+    return server.app
+
+
+def make_payload() -> dict:
+    return {
+        "name": f"Messung {random.randint(1, 99999)}",
+        "mode": random.choice(["distance", "area"]),
+        "points": [{"x": random.uniform(0, 1080), "y": random.uniform(0, 1920), "id": f"p{i}"} for i in range(8)],
+        "calibrationScale": random.uniform(1, 5),
+        "result": {},
+        "unit": "metric",
+    }
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(round(q * (len(sorted_values) - 1))))]
+
+
+async def client_load(base_url: str, duration: float, concurrency: int, create_share: float) -> Dict:
+    latencies: List[float] = []
+    errors = 0
+    deadline = time.perf_counter() + duration
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+
+    async with httpx.AsyncClient(base_url=base_url, limits=limits, timeout=30) as http:
+        async def worker():
+            nonlocal errors
+            while time.perf_counter() < deadline:
+                start = time.perf_counter()
+                try:
+                    if random.random() < create_share:
+                        response = await http.post("/api/measurements", json=make_payload())
+                    else:
+                        response = await http.get("/api/measurements", params={"limit": 20, "fields": "name,mode,result"})
+                    ok = response.status_code < 400
+                except httpx.HTTPError:
+                    ok = False
+                latencies.append(time.perf_counter() - start)
+                errors += not ok
+
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+    return {"latencies": latencies, "errors": errors}
+
+
+def run_client(args) -> Dict:
+    base_url, duration, concurrency, create_share, seed = args
+    random.seed(seed)
+    return asyncio.run(client_load(base_url, duration, concurrency, create_share))
+
+
+def wait_ready(base_url: str, process: subprocess.Popen, timeout: float = 60.0):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"uvicorn exited with {process.returncode}")
+        try:
+            if httpx.get(f"{base_url}/api/", timeout=1).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.2)
+    raise RuntimeError("uvicorn did not come up")
+
+
+def start_server(workers: int, port: int, mongomock: bool) -> subprocess.Popen:
+    env = dict(os.environ)
+    env["PYTHONPATH"] = os.pathsep.join(filter(None, [str(BACKEND_DIR), str(BENCHMARKS_DIR), env.get("PYTHONPATH")]))
+    app = ["scale_test:mongomock_app", "--factory"] if mongomock else ["server:app"]
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", *app, "--host", "127.0.0.1", "--port", str(port),
+         "--workers", str(workers), "--log-level", "warning", "--no-access-log"],
+        cwd=BACKEND_DIR, env=env,
+    )
+
+
+def measure(workers: int, args) -> Dict:
+    base_url = f"http://127.0.0.1:{args.port}"
+    process = start_server(workers, args.port, args.mongomock)
+    try:
+        wait_ready(base_url, process)
+        if args.seed:
+            payload = [make_payload() for _ in range(args.seed)]
+            httpx.post(f"{base_url}/api/measurements/batch", json=payload, timeout=60).raise_for_status()
+
+        with multiprocessing.Pool(args.clients) as pool:
+            # Warm up every worker before measuring
+            pool.map(run_client, [(base_url, 1.0, args.concurrency, args.create_share, i) for i in range(args.clients)])
+            runs = pool.map(run_client, [
+                (base_url, args.duration, args.concurrency, args.create_share, 1000 + i) for i in range(args.clients)
+            ])
+    finally:
+        process.terminate()
+        process.wait(timeout=30)
+
+    latencies = sorted(latency for run in runs for latency in run["latencies"])
+    return {
+        "workers": workers,
+        "requests": len(latencies),
+        "errors": sum(run["errors"] for run in runs),
+        "rps": len(latencies) / args.duration,
+        "p50_ms": percentile(latencies, 0.50) * 1000,
+        "p99_ms": percentile(latencies, 0.99) * 1000,
+    }
+
+
+def print_table(results: List[Dict]):
+    print(f"{'workers':>8}{'requests':>10}{'errors':>8}{'req/s':>10}{'speedup':>9}{'p50 ms':>10}{'p99 ms':>10}")
+    base = results[0]["rps"] or 1.0
+    for r in results:
+        print(f"{r['workers']:>8}{r['requests']:>10}{r['errors']:>8}{r['rps']:>10.0f}"
+              f"{r['rps'] / base:>9.2f}{r['p50_ms']:>10.2f}{r['p99_ms']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4], help="worker counts to compare")
+    parser.add_argument("--mongomock", action="store_true", help="per-worker in-memory database instead of MONGO_URL")
+    parser.add_argument("--clients", type=int, default=max(1, (os.cpu_count() or 2) // 2), help="load generator processes")
+    parser.add_argument("--concurrency", type=int, default=16, help="connections per client process")
+    parser.add_argument("--duration", type=float, default=10.0, help="seconds of load per worker count")
+    parser.add_argument("--create-share", type=float, default=0.2, help="fraction of requests that create a measurement")
+    parser.add_argument("--seed", type=int, default=500, help="measurements to create before each run")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--json", metavar="PATH", help="also write the results as JSON")
+    args = parser.parse_args()
+
+    os.environ.setdefault("MONGO_URL", "mongodb://localhost:27017")
+    os.environ.setdefault("DB_NAME", "ar_mess_benchmark")
+    os.environ.setdefault("IMAGE_STORE_DIR", tempfile.mkdtemp(prefix="ar-mess-images-"))
+    os.environ.setdefault("JOB_OUTPUT_DIR", tempfile.mkdtemp(prefix="ar-mess-jobs-"))
+    results = [measure(workers, args) for workers in args.workers]
+    print_table(results)
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()